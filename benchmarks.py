@@ -0,0 +1,675 @@
+import sys
+import os
+import time
+import random
+import csv
+import functools
+import statistics
+import subprocess
+import tempfile
+import threading
+import requests
+import numpy as np
+import pandas as pd
+import sentimentanalyzer as sa
+import review_scraper_driver as rsd
+import reviewstore
+import rescoring
+import scoringserver
+from tokenizer import Tokenizer
+from lexicon import NgramTrie
+
+# Roughly the number of reviews in reviews_commonurls.csv.
+NUM_REVIEWS = 200000
+
+def load_reviews(reviews_csv):
+    '''
+        A function to read the text of every review in a csv file generated
+        by the review_scraper_driver.py gen_csv_reviews_text function.
+
+        Inputs:
+            reviews_csv: A str object containing the name of the csv file.
+
+        Returns:
+            A list object containing the text of each review.
+    '''
+    with open(reviews_csv, 'r') as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [line[1] for line in reader]
+
+# Fixed stand ins for the NLTK names and stopwords corpora, so the
+# benchmarks run offline and give the same results on every machine.
+SYNTHETIC_NAMES = ['Alice', 'Anna', 'Ben', 'Carl', 'Chris', 'Claire', \
+                   'David', 'Emma', 'Frank', 'Grace', 'Hannah', 'Henry', \
+                   'Isaac', 'Jack', 'James', 'Jane', 'John', 'Julia', \
+                   'Kate', 'Laura', 'Leo', 'Lucy', 'Mark', 'Mary', 'Max', \
+                   'Nina', 'Oliver', 'Paul', 'Peter', 'Rose', 'Ruth', \
+                   'Sam', 'Sarah', 'Simon', 'Sophie', 'Tom', 'Victor', \
+                   'Will', 'Zoe']
+SYNTHETIC_STOPWORDS = ['a', 'about', 'an', 'and', 'are', 'as', 'at', 'be', \
+                       'but', 'by', 'for', 'from', 'had', 'has', 'have', \
+                       'he', 'her', 'his', 'i', 'in', 'is', 'it', 'its', \
+                       'me', 'my', 'of', 'on', 'or', 'she', 'so', 'than', \
+                       'that', 'the', 'their', 'them', 'they', 'this', 'to', \
+                       'too', 'very', 'was', 'we', 'were', 'what', 'which', \
+                       'who', 'will', 'with', 'you', "n't"]
+
+def use_synthetic_resources():
+    '''
+        Make tokenize use SYNTHETIC_NAMES and SYNTHETIC_STOPWORDS rather
+        than downloading and loading the NLTK corpora.
+    '''
+    sa._RESOURCES['names'] = list(SYNTHETIC_NAMES)
+    sa._RESOURCES['stopwords'] = list(SYNTHETIC_STOPWORDS)
+    sa._RESOURCES.pop('tokenizer', None)
+
+def make_corpus(num_reviews, seed=0, reviews_per_movie=200):
+    '''
+        A function to build a deterministic synthetic corpus of labelled
+        reviews with the columns of the csv file made by the
+        review_scraper_driver.py gen_csv_reviews_text function, for timing
+        when the scraped reviews are not available. Most words are drawn
+        from a neutral vocabulary with Zipf-like frequencies, and some from
+        small positive and negative vocabularies according to the label, so
+        the lexicon built from the corpus classifies its reviews. Names,
+        stopwords, punctuation and 'not' appear too, so every branch of
+        tokenize is exercised, and about 1% of reviews repeat an earlier
+        one.
+
+        Inputs:
+            num_reviews: An int object specifying the number of reviews.
+
+            seed: An int object used to seed the random number generator.
+                The same seed always gives the same corpus.
+
+            reviews_per_movie: An int object specifying the number of
+                reviews of each movie.
+
+        Returns:
+            A pandas DataFrame object with columns 'Title', 'Review', and
+                'Review is Positive'.
+    '''
+    rng = np.random.RandomState(seed)
+    neutral = [f'word{i}' for i in range(20000)]
+    neutral += ['Good.', 'bad,', '"great"', 'a', '--', 'Dull!', 'not']
+    neutral += sorted(sa.NAMES)[:200] + sorted(sa.STOPWORDS)
+    positive = [f'pos{i}' for i in range(300)]
+    negative = [f'neg{i}' for i in range(300)]
+    words = neutral + positive + negative
+    weights = 1 / np.arange(1, len(neutral) + 1)
+    weights /= weights.sum()
+    labels = rng.random_sample(num_reviews) < 0.6
+    lengths = rng.randint(5, 40, size=num_reviews)
+    reviews = []
+    # Reviews are made in blocks, so the words of only one block are held.
+    for start in range(0, num_reviews, 100000):
+        block = slice(start, start + 100000)
+        total = int(lengths[block].sum())
+        review_of = np.repeat(np.arange(len(lengths[block])), lengths[block])
+        ids = rng.choice(len(neutral), size=total, p=weights)
+        # About one word in ten carries sentiment, mostly that of the label.
+        sentiment = rng.random_sample(total)
+        is_positive = labels[block][review_of] == (sentiment < 0.08)
+        first = np.where(is_positive, len(neutral), \
+                         len(neutral) + len(positive))
+        ids = np.where(sentiment < 0.1, \
+                       first + rng.randint(0, len(positive), size=total), ids)
+        tokens = [words[i] for i in ids.tolist()]
+        ends = np.cumsum(lengths[block]).tolist()
+        reviews += [' '.join(tokens[begin : end]) \
+                    for begin, end in zip([0] + ends[:-1], ends)]
+    repeats = np.flatnonzero(rng.random_sample(num_reviews) < 0.01)
+    for i in repeats[repeats > 0].tolist():
+        j = rng.randint(0, i)
+        reviews[i] = reviews[j]
+        labels[i] = labels[j]
+    titles = [f'Movie {i}' for i in \
+              (np.arange(num_reviews) // reviews_per_movie).tolist()]
+    return pd.DataFrame({'Title': titles, 'Review': reviews, \
+                         'Review is Positive': labels})
+
+def make_reviews(num_reviews, seed=0):
+    '''
+        Return the text of the reviews of make_corpus, as a list object of
+        num_reviews str objects.
+    '''
+    return make_corpus(num_reviews, seed)['Review'].tolist()
+
+def list_tokenize(rev):
+    '''
+        The original implementation of sentimentanalyzer.tokenize, which
+        checks names and stopwords against lists. Kept as a baseline.
+    '''
+    names = sa.NAMES
+    stopwords = sa.STOPWORDS
+    tokens = []
+    for token in str(rev).split():
+        if token in names:
+            continue
+        token = token.lower().strip(sa.PUNCTUATION)
+        if token in stopwords:
+            continue
+        if len(token) <= 1:
+            continue
+        tokens.append(token)
+    return tokens
+
+def nested_find_tops(pos_revs_dist, neg_revs_dist, alpha=sa.ALPHA):
+    '''
+        The original implementation of sentimentanalyzer.find_tops, which
+        sorts both distributions and removes shared ngrams with nested loops.
+        Kept as a baseline.
+    '''
+    pos_revs_sorted = sorted(pos_revs_dist.items(), \
+                            key=lambda x: x[1], reverse=True)
+    neg_revs_sorted = sorted(neg_revs_dist.items(), \
+                            key=lambda x: x[1], reverse=True)
+    k = round(alpha * min(len(pos_revs_sorted), len(neg_revs_sorted)))
+    most_common_pos = pos_revs_sorted[0: k]
+    most_common_neg = neg_revs_sorted[0: k]
+    i = 0
+    while i < k:
+        j = 0
+        pos_item = most_common_pos[i]
+        while j < k:
+            neg_item = most_common_neg[j]
+            if pos_item[0] == neg_item[0]:
+                most_common_pos.remove(pos_item)
+                most_common_neg.remove(neg_item)
+                k -= 1
+                i -= 1
+                break
+            j += 1
+        i += 1
+    return most_common_pos, most_common_neg
+
+def make_distributions(num_ngrams, overlap=0.5, max_count=50, seed=0):
+    '''
+        A function to build random positive and negative distributions
+        sharing a proportion of their ngrams, with many tied counts.
+
+        Inputs:
+            num_ngrams: An int object specifying the number of ngrams in
+                each distribution.
+
+            overlap: A float object specifying the proportion of ngrams
+                appearing in both distributions.
+
+            max_count: An int object specifying the largest count.
+
+            seed: An int object used to seed the random number generator.
+
+        Returns:
+            A tuple of pos_revs_dist and neg_revs_dist dict objects.
+    '''
+    rng = random.Random(seed)
+    offset = round(num_ngrams * (1 - overlap))
+    grams = ['gram{}'.format(i) for i in range(num_ngrams + offset)]
+    rng.shuffle(grams)
+    pos_revs_dist = {gram: rng.randint(1, max_count) \
+                     for gram in grams[:num_ngrams]}
+    neg_revs_dist = {gram: rng.randint(1, max_count) \
+                     for gram in grams[offset:]}
+    return pos_revs_dist, neg_revs_dist
+
+def check_find_tops(trials=200, seed=0):
+    '''
+        A function which checks that find_tops agrees with the original
+        implementation on small randomized distributions, including empty
+        ones and alpha values from 0 to 1.
+
+        Inputs:
+            trials: An int object specifying the number of random cases.
+
+            seed: An int object used to seed the random number generator.
+
+        Returns:
+            A list object containing the numbers of the trials on which the
+                two disagree, which is empty if they always agree. Running
+                this file runs the check first and exits with status 1 on
+                any mismatch, so the equivalence is exercised even though
+                the project has no test suite.
+    '''
+    rng = random.Random(seed)
+    mismatches = []
+    for trial in range(trials):
+        pos_revs_dist, neg_revs_dist = make_distributions( \
+            rng.randint(0, 300), overlap=rng.random(), \
+            max_count=rng.randint(1, 10), seed=trial)
+        alpha = rng.choice([0, 1, rng.random()])
+        if sa.find_tops(pos_revs_dist, neg_revs_dist, alpha) != \
+           nested_find_tops(pos_revs_dist, neg_revs_dist, alpha):
+            mismatches.append(trial)
+    return mismatches
+
+def make_sentiment_strengths(reviews, seed=0):
+    '''
+        A function to build sentiment_strengths from reviews given random
+        labels, so scoring can be timed against a lexicon of realistic size.
+
+        Inputs:
+            reviews: A list object containing the text of reviews.
+
+            seed: An int object used to seed the random number generator.
+
+        Returns:
+            A sentiment_strengths dict object, as described in the
+                sentimentanalyzer.py stratify function.
+    '''
+    rng = random.Random(seed)
+    revs = {rev: rng.random() < 0.6 for rev in reviews}
+    pos_revs_dist, neg_revs_dist = sa.create_big_dist(revs)
+    most_common_pos, most_common_neg = sa.find_tops(pos_revs_dist, \
+                                                    neg_revs_dist)
+    sentiment_strengths = {}
+    sa.stratify(most_common_pos, most_common_neg, sentiment_strengths)
+    return sentiment_strengths
+
+def time_per_review(func, reviews):
+    '''
+        A function to time func on each review.
+
+        Inputs:
+            func: A callable taking the text of a review.
+
+            reviews: A list object containing the text of reviews.
+
+        Returns:
+            A list object containing the seconds spent on each review.
+    '''
+    times = []
+    for rev in reviews:
+        start = time.perf_counter()
+        func(rev)
+        times.append(time.perf_counter() - start)
+    return times
+
+def time_runs(func, repeat=1, setup=None):
+    '''
+        A function to time repeated calls of func.
+
+        Inputs:
+            func: A callable taking no arguments.
+
+            repeat: An int object specifying the number of calls.
+
+            setup: A callable taking no arguments which is called, untimed,
+                before each call of func, or None.
+
+        Returns:
+            A list object containing the seconds spent on each call, and
+                the result of the last call.
+    '''
+    times = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+def report(name, times):
+    '''
+        Print the total, mean and 99th percentile of a list of timings.
+    '''
+    times = sorted(times)
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    print((f"{name:<28} total {sum(times): 8.3f}s   "
+           f"mean {statistics.mean(times) * 1e6: 8.2f}us   "
+           f"p99 {p99 * 1e6: 8.2f}us"))
+
+def bench_tokenize(reviews, baseline_sample=5000):
+    '''
+        A function which prints the per review latency of tokenize for the
+        original list based implementation, a Tokenizer without a review
+        cache, and a Tokenizer with a review cache on a second pass.
+        The list based implementation is slow enough that it is only timed
+        on the first baseline_sample reviews.
+
+        Inputs:
+            reviews: A list object containing the text of reviews.
+
+            baseline_sample: An int object specifying the number of reviews
+                used to time the original implementation.
+
+        Returns:
+            Nothing is returned. The timings are printed.
+    '''
+    print(f"tokenize: {len(reviews)} reviews")
+    sample = reviews[:baseline_sample]
+    uncached = Tokenizer(sa.NAMES, sa.STOPWORDS, sa.PUNCTUATION)
+    for rev in sample:
+        assert uncached.tokenize(rev) == list_tokenize(rev)
+    report('list lookups (sample)', time_per_review(list_tokenize, sample))
+    uncached = Tokenizer(sa.NAMES, sa.STOPWORDS, sa.PUNCTUATION)
+    report('Tokenizer', time_per_review(uncached.tokenize, reviews))
+    cached = Tokenizer(sa.NAMES, sa.STOPWORDS, sa.PUNCTUATION, \
+                       cache_size=len(reviews))
+    time_per_review(cached.tokenize, reviews)
+    report('Tokenizer (cached pass)', time_per_review(cached.tokenize, reviews))
+
+def bench_find_tops(num_ngrams=50000, alpha=sa.ALPHA):
+    '''
+        A function which prints the time taken by find_tops and by the
+        original implementation on random distributions of num_ngrams
+        ngrams, after checking that the two agree.
+
+        Inputs:
+            num_ngrams: An int object specifying the size of each
+                distribution.
+
+            alpha: A float object passed to find_tops.
+
+        Returns:
+            Nothing is returned. The timings are printed.
+    '''
+    if check_find_tops():
+        raise AssertionError('find_tops disagrees with the original.')
+    print(f"find_tops: {num_ngrams} ngrams, alpha = {alpha}")
+    pos_revs_dist, neg_revs_dist = make_distributions(num_ngrams)
+    for name, func in [('nested loops', nested_find_tops), \
+                       ('find_tops', sa.find_tops)]:
+        start = time.perf_counter()
+        func(pos_revs_dist, neg_revs_dist, alpha)
+        print(f"{name:<28} total {time.perf_counter() - start: 8.3f}s")
+
+def bench_get_sentiment(reviews, sentiment_strengths):
+    '''
+        A function which prints the per review latency of get_sentiment when
+        probing the sentiment_strengths dict for every ngram and when
+        walking an NgramTrie, after checking that the two agree. Reviews are
+        tokenized once beforehand so only matching is timed.
+
+        Inputs:
+            reviews: A list object containing the text of reviews.
+
+            sentiment_strengths: A dict object, as described in the
+                sentimentanalyzer.py stratify function.
+
+        Returns:
+            Nothing is returned. The timings are printed.
+    '''
+    print(f"get_sentiment: {len(reviews)} reviews, " \
+          f"{len(sentiment_strengths)} ngrams")
+    token_lists = [sa.tokenize(rev) for rev in reviews]
+    trie = NgramTrie(sentiment_strengths)
+    for rev in reviews[:1000]:
+        assert sa.get_sentiment(rev, trie) == \
+               sa.get_sentiment(rev, sentiment_strengths)
+    # get_sentiment tokenizes its input, so its dict probing loop is
+    # repeated here on the pre-tokenized reviews.
+    def probe(tokens):
+        sentiment = 0
+        num_words = len(tokens)
+        for j in range(1, 4):
+            for k in range(num_words - j + 1):
+                token = ' '.join(tokens[k : k + j])
+                if j == 1 and k > 0 and tokens[k-1] == 'not':
+                    sentiment -= sentiment_strengths.get(token, 0)
+                else:
+                    sentiment += sentiment_strengths.get(token, 0)
+        return sentiment
+    report('dict probes', time_per_review(probe, token_lists))
+    report('NgramTrie', time_per_review(trie.score, token_lists))
+
+def bench_import(module='rescoring', repeat=5):
+    '''
+        A function which prints the time taken to start a fresh interpreter
+        and import module, against the time to start an interpreter alone.
+
+        Inputs:
+            module: A str object containing the name of the module.
+
+            repeat: An int object specifying the number of runs to average.
+
+        Returns:
+            Nothing is returned. The timings are printed.
+    '''
+    print(f"import {module}: mean of {repeat} runs")
+    for name, code in [('interpreter only', 'pass'), \
+                       (f'import {module}', f'import {module}')]:
+        times, _ = time_runs(lambda: subprocess.run( \
+            [sys.executable, '-c', code], check=True, \
+            cwd=os.path.dirname(os.path.abspath(__file__))), repeat)
+        print(f"{name:<28} mean {statistics.mean(times): 8.3f}s")
+
+def make_movies(reviews, reviews_per_movie=200, seed=0):
+    '''
+        A function to group the text of reviews into a synthetic reviews
+        object, as described in the review_scraper_driver.py
+        read_movie_page function, with random labels and scores.
+
+        Inputs:
+            reviews: A list object containing the text of reviews.
+
+            reviews_per_movie: An int object specifying the number of
+                reviews given to each movie.
+
+            seed: An int object used to seed the random number generator.
+
+        Returns:
+            The reviews dict object.
+    '''
+    rng = random.Random(seed)
+    movies = {}
+    for start in range(0, len(reviews), reviews_per_movie):
+        revs = {rev: rng.random() < 0.6 \
+                for rev in reviews[start : start + reviews_per_movie]}
+        movies[f'Movie {start // reviews_per_movie}'] = \
+            [revs, str(rng.randint(0, 100)), str(rng.randint(0, 100)), \
+             rng.choice(['rotten', 'fresh', 'certified-fresh'])]
+    return movies
+
+def bench_storage(reviews):
+    '''
+        A function which prints the time taken to load reviews and scores
+        from the csv files written by review_scraper_driver.py and from
+        Parquet and Arrow stores written by reviewstore.py, both as a
+        reviews object and as DataFrames, after checking that every path
+        loads the same data.
+
+        Inputs:
+            reviews: A list object containing the text of reviews.
+
+        Returns:
+            Nothing is returned. The timings are printed.
+    '''
+    movies = make_movies(reviews)
+    print(f"storage: {len(reviews)} reviews, {len(movies)} movies")
+    with tempfile.TemporaryDirectory() as directory:
+        scores_csv = os.path.join(directory, 'scores.csv')
+        reviews_csv = os.path.join(directory, 'reviews.csv')
+        rsd.gen_csv(movies, scores_csv, sa_scores=False)
+        rsd.gen_csv_reviews_text(movies, reviews_csv)
+        expected = rsd.gen_revs_from_csvs(scores_csv, reviews_csv, False)
+        expected_revs = pd.read_csv(reviews_csv)
+        expected_scores = pd.read_csv(scores_csv)
+        loaders = [('csv', \
+                    lambda: rsd.gen_revs_from_csvs(scores_csv, reviews_csv, \
+                                                   False), \
+                    lambda: (pd.read_csv(reviews_csv), \
+                             pd.read_csv(scores_csv)))]
+        for file_format in reviewstore.EXTENSIONS:
+            store = os.path.join(directory, file_format)
+            reviewstore.write_reviews_store(movies, store, False, file_format)
+            loaders.append((file_format, \
+                            functools.partial(reviewstore.read_reviews, \
+                                              store, False), \
+                            functools.partial(lambda store: \
+                                (reviewstore.read_reviews_df(store), \
+                                 reviewstore.read_scores_df(store)), store)))
+        for name, load_reviews_object, load_dfs in loaders:
+            assert load_reviews_object() == expected
+            df_revs, df_scores = load_dfs()
+            pd.testing.assert_frame_equal(df_revs, expected_revs)
+            pd.testing.assert_frame_equal(df_scores, expected_scores)
+            for kind, load in [('reviews object', load_reviews_object), \
+                               ('DataFrames', load_dfs)]:
+                start = time.perf_counter()
+                load()
+                print(f"{name + ' ' + kind:<28} total " \
+                      f"{time.perf_counter() - start: 8.3f}s")
+
+def bench_rescoring(reviews, sentiment_strengths, process_counts=None):
+    '''
+        A function which prints the time taken by the rescoring.py
+        add_sentiment_scores function with each number of worker processes
+        in process_counts, and the speedup over one process, after checking
+        that every run writes the same csv file.
+
+        Inputs:
+            reviews: A list object containing the text of reviews.
+
+            sentiment_strengths: A dict object, as described in the
+                sentimentanalyzer.py stratify function.
+
+            process_counts: A list object containing numbers of processes.
+                By default, powers of 2 up to the number of cores are used.
+
+        Returns:
+            Nothing is returned. The timings are printed.
+    '''
+    if process_counts is None:
+        process_counts = [1]
+        while process_counts[-1] * 2 <= os.cpu_count():
+            process_counts.append(process_counts[-1] * 2)
+    movies = make_movies(reviews)
+    print(f"add_sentiment_scores: {len(reviews)} reviews, " \
+          f"{len(movies)} movies")
+    with tempfile.TemporaryDirectory() as directory:
+        scores_csv = os.path.join(directory, 'scores.csv')
+        reviews_csv = os.path.join(directory, 'reviews.csv')
+        rsd.gen_csv(movies, scores_csv, sa_scores=False)
+        rsd.gen_csv_reviews_text(movies, reviews_csv)
+        expected = None
+        for processes in process_counts:
+            file_name = os.path.join(directory, f'sa_{processes}.csv')
+            start = time.perf_counter()
+            rescoring.add_sentiment_scores(scores_csv, reviews_csv, \
+                                           sentiment_strengths, file_name, \
+                                           processes=processes)
+            elapsed = time.perf_counter() - start
+            with open(file_name, 'r') as f:
+                output = f.read()
+            if expected is None:
+                expected = output
+                baseline = elapsed
+            assert output == expected
+            print(f"{f'{processes} processes':<28} total {elapsed: 8.3f}s" \
+                  f"   speedup {baseline / elapsed: 6.2f}x")
+
+def load_test(url, reviews, clients=8, num_requests=2000, batch_size=10, \
+              titles=()):
+    '''
+        A function which sends requests to a running scoringserver.py server
+        from clients threads, and prints the throughput and the p50 and p99
+        latency seen by the clients alongside those reported by the server.
+
+        Inputs:
+            url: A str object containing the base url of the server, such as
+                'http://127.0.0.1:8000/'.
+
+            reviews: A list object containing the text of reviews, which are
+                sent in batches of batch_size.
+
+            clients: An int object specifying the number of concurrent
+                clients.
+
+            num_requests: An int object specifying the total number of
+                requests.
+
+            titles: An iterable of stored movie titles. If any are given,
+                every tenth request rescores one of them.
+
+        Returns:
+            Nothing is returned. The results are printed.
+    '''
+    titles = list(titles)
+    latencies = []
+    lock = threading.Lock()
+
+    def client(k):
+        session = requests.Session()
+        rng = random.Random(k)
+        times = []
+        for i in range(k, num_requests, clients):
+            start = time.perf_counter()
+            if titles and i % 10 == 0:
+                response = session.get(url + 'movie', \
+                                       params={'title': rng.choice(titles)})
+            else:
+                first = rng.randrange(max(1, len(reviews) - batch_size))
+                response = session.post(url + 'score', json={'reviews': \
+                    reviews[first : first + batch_size]})
+            response.raise_for_status()
+            times.append(time.perf_counter() - start)
+        session.close()
+        with lock:
+            latencies.extend(times)
+
+    print(f"load test: {num_requests} requests from {clients} clients, " \
+          f"{batch_size} reviews per batch")
+    threads = [threading.Thread(target=client, args=(k,)) \
+               for k in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{'client':<28} {num_requests / elapsed: 8.1f} requests/s   " \
+          f"p50 {scoringserver.percentile(latencies, 50) * 1e3: 8.2f}ms   " \
+          f"p99 {scoringserver.percentile(latencies, 99) * 1e3: 8.2f}ms")
+    for endpoint, stats in requests.get(url + 'stats').json().items():
+        print(f"{'server ' + endpoint:<28} {stats['count']: 8d} requests     " \
+              f"p50 {stats['p50_ms']: 8.2f}ms   p99 {stats['p99_ms']: 8.2f}ms")
+
+def bench_server(reviews, sentiment_strengths, **kwargs):
+    '''
+        A function which starts a scoringserver.py server on localhost with
+        sentiment_strengths and synthetic movies built from reviews, and
+        runs load_test against it.
+
+        Inputs:
+            reviews: A list object containing the text of reviews.
+
+            sentiment_strengths: A dict object, as described in the
+                sentimentanalyzer.py stratify function.
+
+            kwargs: Keyword arguments passed to load_test.
+
+        Returns:
+            Nothing is returned. The results are printed.
+    '''
+    movies = make_movies(reviews)
+    service = scoringserver.ScoringService(sentiment_strengths, movies)
+    server, url = scoringserver.serve(service, port=0)
+    try:
+        load_test(url, reviews, titles=movies, **kwargs)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == '__main__':
+    mismatches = check_find_tops()
+    if mismatches:
+        print(f"find_tops disagrees with the original on trials {mismatches}", \
+              file=sys.stderr)
+        sys.exit(1)
+    if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
+        reviews = load_reviews(sys.argv[1])
+    else:
+        use_synthetic_resources()
+        reviews = make_reviews(NUM_REVIEWS)
+    bench_import()
+    bench_tokenize(reviews)
+    bench_find_tops()
+    sentiment_strengths = make_sentiment_strengths(reviews[:50000])
+    bench_get_sentiment(reviews, sentiment_strengths)
+    bench_storage(reviews)
+    bench_rescoring(reviews, sentiment_strengths)
+    bench_server(reviews, sentiment_strengths)
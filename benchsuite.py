@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import platform
+import statistics
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+import sentimentanalyzer as sa
+import vocabulary
+import trainer
+import dataprep
+from tokenizer import Tokenizer
+from lexicon import Lexicon
+from benchmarks import make_corpus, time_runs, use_synthetic_resources
+
+# The number of reviews in the synthetic corpus at each scale.
+SCALES = {'10k': 10000, '100k': 100000, '1m': 1000000}
+BASELINE_FILE = 'benchmark_baseline.json'
+
+#########################################################################
+# Stages
+#########################################################################
+def _fingerprint(result):
+    '''
+        Return a short digest of the result of a stage, so a change in what
+        a stage computes is reported alongside a change in its speed.
+    '''
+    digest = hashlib.blake2b(digest_size=8)
+
+    def update(value):
+        if isinstance(value, np.ndarray):
+            digest.update(value.tobytes())
+        elif isinstance(value, pd.DataFrame):
+            digest.update(pd.util.hash_pandas_object(value).to_numpy() \
+                          .tobytes())
+        elif isinstance(value, vocabulary.NgramDistribution):
+            update(value.keys)
+            update(value.counts)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                update(key)
+                update(item)
+        elif isinstance(value, list) and value and isinstance(value[0], list):
+            # Token lists, which are too many to hash one token at a time.
+            digest.update('\n'.join(map(' '.join, value)).encode('utf-8'))
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                update(item)
+        else:
+            digest.update(repr(value).encode('utf-8'))
+    update(result)
+    return digest.hexdigest()
+
+def _stage_csv_write(state):
+    state['df'].to_csv(state['reviews_csv'], index=False)
+    return os.path.getsize(state['reviews_csv'])
+
+def _stage_csv_read(state):
+    state['df_train'], state['df_test'] = \
+        dataprep.make_train_test(state['reviews_csv'])
+    return state['df_train'], state['df_test']
+
+def _stage_get_revs(state):
+    state['revs'] = sa.get_revs(state['df_train'])
+    return len(state['revs'])
+
+def _stage_tokenize(state):
+    tokenizer = Tokenizer(sa.NAMES, sa.STOPWORDS, sa.PUNCTUATION)
+    return [tokenizer.tokenize(rev) for rev in state['revs']]
+
+def _stage_distributions(state):
+    state['pos_dist'], state['neg_dist'] = \
+        vocabulary.create_big_dist(state['revs'])
+    return state['pos_dist'], state['neg_dist']
+
+def _stage_find_tops(state):
+    state['tops'] = vocabulary.find_tops(state['pos_dist'], state['neg_dist'])
+    return state['tops']
+
+def _stage_stratify(state):
+    state['sentiment_strengths'] = {}
+    vocabulary.stratify(state['pos_dist'].vocab, *state['tops'], \
+                        state['sentiment_strengths'])
+    return state['sentiment_strengths']
+
+def _stage_tuning(state):
+    # The sweep tune_alpha runs, in this process so that pool start up is
+    # not timed.
+    sweep = trainer.AlphaSweep(state['pos_dist'], state['neg_dist'], \
+                               state['df_test'])
+    return [sweep.ratio(alpha) for alpha in trainer.alpha_range(0.1, 1.0, 0.1)]
+
+def _stage_scoring(state):
+    raw_scores = sa.score_many(state['df_test']['Review'].tolist(), \
+                               Lexicon(state['sentiment_strengths'], \
+                                       state['pos_dist'].vocab))
+    return raw_scores
+
+# Each stage reads what earlier stages store in the state dict object, so
+# stages run in this order.
+STAGES = [('csv_write', _stage_csv_write), ('csv_read', _stage_csv_read), \
+          ('get_revs', _stage_get_revs), ('tokenize', _stage_tokenize), \
+          ('distributions', _stage_distributions), \
+          ('find_tops', _stage_find_tops), ('stratify', _stage_stratify), \
+          ('tuning', _stage_tuning), ('scoring', _stage_scoring)]
+
+def run_stage(func, state, repeat=3, memory=True):
+    '''
+        A function which times one stage of the pipeline.
+
+        Inputs:
+            func: A callable taking the state dict object.
+
+            state: A dict object holding the results of earlier stages.
+
+            repeat: An int object specifying the number of timed runs. The
+                median is reported.
+
+            memory: A boolean. If True, the stage is run once more under
+                tracemalloc to find the peak memory it allocates, which is
+                not timed, since tracing slows allocation down.
+
+        Returns:
+            A dict object holding the median seconds, the peak MiB allocated
+                (or None), and the fingerprint of the stage's result.
+    '''
+    # The tokenizer's review cache would make every run after the first
+    # faster than a fresh process.
+    times, result = time_runs(lambda: func(state), repeat, \
+                              sa.get_tokenizer().clear_cache)
+    peak = None
+    if memory:
+        sa.get_tokenizer().clear_cache()
+        tracemalloc.start()
+        func(state)
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return {'seconds': statistics.median(times), 'peak_mib': peak, \
+            'fingerprint': _fingerprint(result)}
+
+def run_suite(scales=('10k',), stages=None, repeat=3, memory=True, seed=0):
+    '''
+        A function which times each stage of the pipeline on the synthetic
+        corpus at each scale, printing a line per stage as it finishes.
+
+        Inputs:
+            scales: An iterable of keys of SCALES.
+
+            stages: An iterable of the names of stages in STAGES to report,
+                or None for all. The stages they depend on still run.
+
+            repeat, memory: As in run_stage.
+
+            seed: As in the benchmarks.py make_corpus function.
+
+        Returns:
+            A dict object mapping each scale to a dict object mapping each
+                stage reported to the dict object returned by run_stage.
+    '''
+    wanted = set(name for name, _ in STAGES) if stages is None else set(stages)
+    use_synthetic_resources()
+    results = {}
+    for scale in scales:
+        times, df = time_runs(lambda: make_corpus(SCALES[scale], seed))
+        print(f"{scale}: {len(df)} reviews, generated in {times[0]:.2f}s")
+        results[scale] = {}
+        with tempfile.TemporaryDirectory() as directory:
+            state = {'df': df, \
+                     'reviews_csv': os.path.join(directory, 'reviews.csv')}
+            last = max(i for i, (name, _) in enumerate(STAGES) \
+                       if name in wanted)
+            for name, func in STAGES[:last + 1]:
+                if name in wanted:
+                    result = run_stage(func, state, repeat, memory)
+                    results[scale][name] = result
+                    print(_format(name, result))
+                else:
+                    func(state)
+    return results
+
+#########################################################################
+# Baselines
+#########################################################################
+def _format(name, result, baseline=None):
+    line = f"  {name:<16} {result['seconds']: 9.3f}s"
+    if result['peak_mib'] is not None:
+        line += f" {result['peak_mib']: 9.1f}MiB"
+    if baseline:
+        line += f"   {result['seconds'] / baseline['seconds']: 6.2f}x baseline"
+    return line
+
+def save_baseline(results, file_name=BASELINE_FILE):
+    '''
+        A function which stores results from run_suite as a json file,
+        merged into the results already stored there, with a note of the
+        machine they were taken on.
+    '''
+    stored = load_baseline(file_name)
+    for scale, stages in results.items():
+        stored.setdefault('results', {}).setdefault(scale, {}).update(stages)
+    stored['machine'] = {'python': platform.python_version(), \
+                         'platform': platform.platform(), \
+                         'cpus': os.cpu_count()}
+    with open(file_name + '.tmp', 'w') as f:
+        json.dump(stored, f, indent=2, sort_keys=True)
+    os.replace(file_name + '.tmp', file_name)
+
+def load_baseline(file_name=BASELINE_FILE):
+    '''
+        Return the dict object stored by save_baseline, or an empty dict
+        object if there is none.
+    '''
+    if not os.path.exists(file_name):
+        return {}
+    with open(file_name) as f:
+        return json.load(f)
+
+def compare(results, baseline, tolerance=0.25):
+    '''
+        A function which compares results from run_suite with a baseline.
+
+        Inputs:
+            results: A dict object returned by run_suite.
+
+            baseline: A dict object returned by load_baseline.
+
+            tolerance: A float object specifying how much slower, or more
+                memory hungry, than the baseline a stage may be, as a
+                proportion of the baseline.
+
+        Returns:
+            A list object of str objects, each describing a stage which
+                became slower or used more memory than allowed, or whose
+                result changed. Stages missing from the baseline are
+                skipped.
+    '''
+    problems = []
+    stored = baseline.get('results', {})
+    for scale, stages in results.items():
+        for name, result in stages.items():
+            old = stored.get(scale, {}).get(name)
+            if not old:
+                continue
+            if result['seconds'] > old['seconds'] * (1 + tolerance):
+                problems.append(f"{scale} {name}: {result['seconds']:.3f}s " \
+                                f"against {old['seconds']:.3f}s")
+            if result['peak_mib'] is not None and \
+               old.get('peak_mib') is not None and \
+               result['peak_mib'] > old['peak_mib'] * (1 + tolerance):
+                problems.append(f"{scale} {name}: {result['peak_mib']:.1f}MiB " \
+                                f"against {old['peak_mib']:.1f}MiB")
+            if result['fingerprint'] != old['fingerprint']:
+                problems.append(f"{scale} {name}: result changed")
+    return problems
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser( \
+        description='Time each stage of the pipeline on synthetic reviews.')
+    parser.add_argument('--scales', nargs='+', default=['10k'], \
+                        choices=list(SCALES))
+    parser.add_argument('--stages', nargs='+', \
+                        choices=[name for name, _ in STAGES])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    results = run_suite(args.scales, args.stages, args.repeat, \
+                        not args.no_memory, args.seed)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+    else:
+        baseline = load_baseline(args.baseline)
+        if baseline:
+            for scale, stages in results.items():
+                print(scale)
+                for name, result in stages.items():
+                    old = baseline.get('results', {}).get(scale, {}).get(name)
+                    print(_format(name, result, old))
+            problems = compare(results, baseline, args.tolerance)
+            for problem in problems:
+                print(f"REGRESSION {problem}")
+            sys.exit(1 if problems else 0)
@@ -0,0 +1,283 @@
+import threading
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from selenium.webdriver import Firefox, FirefoxOptions
+import review_scraper_driver as rsd
+import httpdriver
+
+#########################################################################
+# Drivers
+#########################################################################
+def firefox_driver():
+    '''
+        Start a Firefox driver configured as in read_movie_page.
+    '''
+    driver = Firefox()
+    driver.implicitly_wait(3)
+    return driver
+
+def headless_firefox_driver():
+    '''
+        Start a Firefox driver without a window, for servers and for crawling
+        local fixtures.
+    '''
+    options = FirefoxOptions()
+    options.add_argument('-headless')
+    driver = Firefox(options=options)
+    driver.implicitly_wait(3)
+    return driver
+
+def is_alive(driver):
+    '''
+        Return whether a driver still answers. Reading the current url of a
+        selenium driver whose browser has crashed raises an exception.
+    '''
+    try:
+        driver.current_url
+    except:
+        return False
+    return True
+
+class DriverPool:
+    '''
+        A fixed-size pool of long-lived selenium drivers shared by crawling
+        threads. Drivers are started when first needed, handed out one
+        thread at a time, and quit and replaced after they have visited
+        recycle_after movie pages, which keeps browser memory in check
+        without paying browser startup for every movie. A driver whose
+        thread raised an exception, or which no longer answers when it is
+        released or handed out again, is quit rather than reused, since
+        the review_scraper_driver.py page readers catch the exceptions of
+        a crashed browser themselves.
+
+        Inputs:
+            size: An int object specifying the maximum number of drivers.
+
+            recycle_after: An int object specifying the number of movie pages
+                a driver visits before it is replaced.
+
+            driver_factory: A function with no arguments which starts a
+                driver.
+    '''
+    def __init__(self, size, recycle_after=50, driver_factory=firefox_driver):
+        self.size = size
+        self.recycle_after = recycle_after
+        self.driver_factory = driver_factory
+        self._idle = []
+        self._pages = {}
+        self._started = 0
+        self._available = threading.Condition()
+
+    def acquire(self):
+        '''
+            Return an idle driver, starting one if fewer than size are
+            running, and otherwise waiting for one to be released.
+        '''
+        while True:
+            with self._available:
+                while not self._idle and self._started >= self.size:
+                    self._available.wait()
+                if not self._idle:
+                    self._started += 1
+                    break
+                driver = self._idle.pop()
+            # A browser may have crashed while its driver was idle.
+            if is_alive(driver):
+                return driver
+            self._discard(driver)
+        try:
+            driver = self.driver_factory()
+        except:
+            with self._available:
+                self._started -= 1
+                self._available.notify()
+            raise
+        with self._available:
+            self._pages[driver] = 0
+        return driver
+
+    def release(self, driver, pages=1, broken=False):
+        '''
+            Return a driver to the pool after it has visited pages movie
+            pages. It is quit instead if it is due for recycling, broken,
+            or no longer answers.
+        '''
+        broken = broken or not is_alive(driver)
+        with self._available:
+            self._pages[driver] += pages
+            retire = broken or self._pages[driver] >= self.recycle_after
+            if not retire:
+                self._idle.append(driver)
+                self._available.notify()
+                return
+        self._discard(driver)
+
+    def _discard(self, driver):
+        '''
+            Quit a driver and free its place in the pool.
+        '''
+        try:
+            driver.quit()
+        except:
+            pass
+        with self._available:
+            del self._pages[driver]
+            self._started -= 1
+            self._available.notify()
+
+    @contextmanager
+    def driver(self):
+        '''
+            A context manager which acquires a driver for one movie page and
+            releases it afterwards.
+        '''
+        driver = self.acquire()
+        try:
+            yield driver
+        except:
+            self.release(driver, broken=True)
+            raise
+        self.release(driver)
+
+    def close(self):
+        '''
+            Quit every idle driver. Call once no thread is using the pool.
+        '''
+        with self._available:
+            idle = self._idle
+            self._idle = []
+        for driver in idle:
+            self._discard(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+#########################################################################
+# Crawling
+#########################################################################
+def find_reviews(url_list, concurrency=4, recycle_after=50, \
+                 driver_factory=firefox_driver, fallback_factory=None, \
+                 journal=None, known_reviews=None):
+    '''
+        A concurrent version of the review_scraper_driver.py find_reviews
+        function. Movie pages are read by a pool of concurrency threads,
+        each borrowing a driver from a DriverPool of the same size. Threads
+        suit this work, since it is spent waiting on the browser.
+
+        Inputs:
+            url_list: A list object containing strings with the urls of movie
+                pages that we will scrape.
+
+            concurrency: An int object specifying the number of movie pages
+                read at once.
+
+            recycle_after, driver_factory: As in DriverPool. Passing
+                httpdriver.HttpDriver as driver_factory crawls over plain
+                HTTP instead of with a browser.
+
+            fallback_factory: As in the httpdriver.py read_movie_info
+                function.
+
+            journal, known_reviews: As in the review_scraper_driver.py
+                find_reviews function.
+
+        Returns:
+            The reviews dict object described in the review_scraper_driver.py
+                read_movie_page function, with movies in the order of
+                url_list.
+    '''
+    reviews = {}
+    with DriverPool(concurrency, recycle_after, driver_factory) as pool:
+        def scrape(url):
+            movie = journal.result('movie', url) if journal else None
+            if movie is not None:
+                return movie
+            try:
+                with pool.driver() as driver:
+                    movie = httpdriver.read_movie_info(driver, url, \
+                                                       fallback_factory, \
+                                                       known_reviews)
+            except:
+                return None
+            if movie and journal:
+                journal.record('movie', url, movie)
+            return movie
+        with ThreadPoolExecutor(concurrency) as executor:
+            for movie in executor.map(scrape, url_list):
+                if movie:
+                    title, info = movie
+                    reviews[title] = info
+    return reviews
+
+def get_reviews_and_scores(url_list, concurrency=4, recycle_after=50, \
+                           driver_factory=firefox_driver, \
+                           fallback_factory=None, journal=None):
+    '''
+        A concurrent version of the review_scraper_driver.py
+        get_reviews_and_scores function, generating the same csv files.
+
+        Inputs:
+            As in find_reviews.
+
+        Returns:
+            Nothing is returned, but the csv files are generated.
+    '''
+    reviews = find_reviews(url_list, concurrency, recycle_after, \
+                           driver_factory, fallback_factory, journal)
+    rsd.gen_csv(reviews, 'rottentomatoes.csv', sa_scores=False)
+    rsd.gen_csv_reviews_text(reviews, 'reviewstext.csv')
+
+def refresh_reviews_and_scores(url_list, scores_csv='rottentomatoes.csv', \
+                               reviews_csv='reviewstext.csv', concurrency=4, \
+                               recycle_after=50, driver_factory=firefox_driver, \
+                               fallback_factory=None):
+    '''
+        A concurrent version of the review_scraper_driver.py
+        refresh_reviews_and_scores function, updating the same csv files.
+
+        Inputs:
+            url_list, scores_csv, and reviews_csv are as in
+                review_scraper_driver.refresh_reviews_and_scores, and the
+                rest are as in find_reviews.
+
+        Returns:
+            Nothing is returned, but the csv files are rewritten.
+    '''
+    reviews = rsd.gen_revs_from_csvs(scores_csv, reviews_csv, sa_scores=False)
+    new_reviews = find_reviews(url_list, concurrency, recycle_after, \
+                               driver_factory, fallback_factory, \
+                               known_reviews=reviews)
+    rsd.merge_reviews(reviews, new_reviews)
+    rsd.gen_csv(reviews, scores_csv, sa_scores=False)
+    rsd.gen_csv_reviews_text(reviews, reviews_csv)
+
+#########################################################################
+# Fixtures
+#########################################################################
+def serve_fixtures(directory, port=0):
+    '''
+        A function which serves saved html pages from a local directory,
+        so the crawler can be run against fixtures instead of the live
+        site. The server runs in a background thread.
+
+        Inputs:
+            directory: A str object containing the directory of pages.
+
+            port: An int object specifying the port. 0 picks a free port.
+
+        Returns:
+            A tuple of the ThreadingHTTPServer object, which should be shut
+                down with its shutdown method, and a str object containing
+                the base url of the served directory.
+    '''
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}/'
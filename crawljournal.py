@@ -0,0 +1,121 @@
+import json
+import time
+import sqlite3
+import threading
+import review_scraper_driver as rsd
+import httpdriver
+
+class CrawlJournal:
+    '''
+        An on-disk record of crawl progress, kept in a SQLite database so a
+        crawl which dies partway through can be restarted without redoing
+        finished work. It stores the parsed result of each finished url,
+        grouped by kind ('movie' for Rotten Tomatoes movie pages and 'imdb'
+        for IMDb list pages), and the raw body and ETag of each page fetched
+        by an httpdriver.HttpDriver using it as a cache. Every write is
+        committed immediately. The object may be shared by threads.
+
+        Inputs:
+            file_name: A str object containing the name of the database
+                file, which is created if it does not exist.
+    '''
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._connection = sqlite3.connect(file_name, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                '''CREATE TABLE IF NOT EXISTS results (
+                       kind TEXT, url TEXT, result TEXT, finished REAL,
+                       PRIMARY KEY (kind, url))''')
+            self._connection.execute(
+                '''CREATE TABLE IF NOT EXISTS pages (
+                       url TEXT PRIMARY KEY, final_url TEXT, etag TEXT,
+                       body BLOB, fetched REAL)''')
+
+    def record(self, kind, url, result):
+        '''
+            Record the parsed result of a finished url. result must be
+            serializable as json.
+        '''
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', \
+                (kind, url, json.dumps(result), time.time()))
+
+    def result(self, kind, url):
+        '''
+            Return the recorded result of a url, or None if it has not
+            finished.
+        '''
+        with self._lock:
+            row = self._connection.execute( \
+                'SELECT result FROM results WHERE kind = ? AND url = ?', \
+                (kind, url)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def finished(self, kind):
+        '''
+            Return the set of urls of a kind which have finished.
+        '''
+        with self._lock:
+            rows = self._connection.execute( \
+                'SELECT url FROM results WHERE kind = ?', (kind,)).fetchall()
+        return {row[0] for row in rows}
+
+    def put_page(self, url, final_url, etag, body):
+        '''
+            Store the body of a fetched page along with its ETag and the url
+            it was served from after any redirects.
+        '''
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)', \
+                (url, final_url, etag, body, time.time()))
+
+    def get_page(self, url):
+        '''
+            Return a tuple of the final url, ETag, and body of a stored page,
+            or None if url has not been stored.
+        '''
+        with self._lock:
+            return self._connection.execute( \
+                'SELECT final_url, etag, body FROM pages WHERE url = ?', \
+                (url,)).fetchone()
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def reparse_reviews(journal, url_list):
+    '''
+        A function which rebuilds the reviews object for url_list entirely
+        from the pages stored in journal, without fetching anything, so that
+        changes to the parsing code can be applied to an earlier crawl.
+        The crawl must have used httpdriver.HttpDriver objects with journal
+        as their cache. Movies whose page is missing are left out, and
+        paging stops at the first missing page of reviews.
+
+        Inputs:
+            journal: A CrawlJournal object.
+
+            url_list: A list object containing strings with the urls of movie
+                pages.
+
+        Returns:
+            The reviews dict object described in the review_scraper_driver.py
+                read_movie_page function.
+    '''
+    reviews = {}
+    driver = httpdriver.HttpDriver(cache=journal, cache_only=True)
+    for url in url_list:
+        movie = rsd.read_movie_info(driver, url)
+        if movie:
+            title, info = movie
+            reviews[title] = info
+    return reviews
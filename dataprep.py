@@ -0,0 +1,206 @@
+import os
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Changed whenever splitting changes, so older cached splits are never
+# reused.
+SPLIT_VERSION = 1
+METHODS = ('random', 'stratified', 'grouped')
+
+#########################################################################
+# Training Mapping
+#########################################################################
+def get_revs(df_train, conflicts='last'):
+    '''
+        A function which obtains the mapping of review text to label that
+        the sentimentanalyzer.py get_revs function does, reading whole
+        columns at once rather than a row at a time.
+
+        Inputs:
+            df_train: A pandas DataFrame object as described in the
+                sentimentanalyzer.py get_revs function.
+
+            conflicts: How a review repeated with different labels is
+                treated. 'last' keeps the last label, as
+                sentimentanalyzer.py get_revs does, 'first' keeps the first
+                label, and 'drop' leaves the review out.
+
+        Returns:
+            A dict object as described in the sentimentanalyzer.py get_revs
+                function. Reviews are in the order of their first row.
+    '''
+    reviews = df_train['Review'].tolist()
+    labels = df_train['Review is Positive'].to_numpy()
+    if conflicts == 'last':
+        return dict(zip(reviews, labels))
+    if conflicts not in ('first', 'drop'):
+        raise ValueError(f'Unknown conflicts {conflicts!r}.')
+    revs = {}
+    for rev, is_pos in zip(reviews, labels):
+        revs.setdefault(rev, is_pos)
+    if conflicts == 'drop':
+        codes, uniques = pd.factorize(df_train['Review'], use_na_sentinel=False)
+        conflicting = _conflicting(codes, labels, len(uniques))
+        for row in _first_rows(codes, len(uniques))[conflicting].tolist():
+            del revs[reviews[row]]
+    return revs
+
+def _first_rows(codes, num_reviews):
+    '''
+        Return the row of the first occurrence of each factorized review.
+    '''
+    first = np.full(num_reviews, len(codes), dtype=np.int64)
+    np.minimum.at(first, codes, np.arange(len(codes)))
+    return first
+
+def _conflicting(codes, labels, num_reviews):
+    '''
+        Return a boolean numpy array marking the factorized reviews that
+        appear with both labels.
+    '''
+    rows = np.bincount(codes, minlength=num_reviews)
+    positive = np.bincount(codes, weights=labels.astype(bool), \
+                           minlength=num_reviews)
+    return (positive > 0) & (positive < rows)
+
+def duplicate_stats(df_train):
+    '''
+        A function which counts the repeated reviews in training data, which
+        get_revs reduces to one entry each.
+
+        Inputs:
+            df_train: As in get_revs.
+
+        Returns:
+            A dict object holding the number of rows, of distinct reviews,
+                of rows repeating an earlier review, of distinct reviews
+                appearing with both labels, and of the rows holding them.
+    '''
+    codes, uniques = pd.factorize(df_train['Review'], use_na_sentinel=False)
+    labels = df_train['Review is Positive'].to_numpy()
+    conflicting = _conflicting(codes, labels, len(uniques))
+    return {'rows': len(codes), 'reviews': len(uniques), \
+            'duplicate_rows': len(codes) - len(uniques), \
+            'conflicting_reviews': int(conflicting.sum()), \
+            'conflicting_rows': int(conflicting[codes].sum())}
+
+#########################################################################
+# Splitting
+#########################################################################
+def split(df, frac=0.4, seed=0, method='random'):
+    '''
+        A function which splits reviews into training and test sets.
+
+        Inputs:
+            df: A pandas DataFrame object as described in get_revs.
+
+            frac: A float object specifying the proportion of rows used for
+                training.
+
+            seed: An int object seeding the random choice of rows.
+
+            method: 'random' samples rows, as the scores_data_analysis.py
+                make_train_test function always has. 'stratified' samples
+                the positive and negative rows separately, so both sets have
+                the same proportion of positive reviews. 'grouped' samples
+                whole movies, so no movie has reviews in both sets.
+
+        Returns:
+            df_train, df_test: pandas DataFrame objects with the columns of
+                df, indexed from 0.
+    '''
+    if method == 'random':
+        df_train = df.sample(frac=frac, random_state=seed)
+    elif method == 'stratified':
+        df_train = df.groupby('Review is Positive', group_keys=False) \
+                     .sample(frac=frac, random_state=seed)
+    elif method == 'grouped':
+        codes, titles = pd.factorize(df['Title'], use_na_sentinel=False)
+        order = np.random.RandomState(seed).permutation(len(titles))
+        # Movies are taken in a random order until frac of the rows are.
+        sizes = np.bincount(codes, minlength=len(titles))[order]
+        taken = order[np.cumsum(sizes) - sizes < frac * len(df)]
+        in_train = np.zeros(len(titles), dtype=bool)
+        in_train[taken] = True
+        df_train = df[in_train[codes]]
+    else:
+        raise ValueError(f'Unknown split method {method!r}.')
+    df_test = df.drop(df_train.index)
+    df_train = df_train.reset_index(drop=True)
+    df_test = df_test.reset_index(drop=True)
+    return df_train, df_test
+
+def _checksum(file_name):
+    '''
+        Return a hexadecimal digest of the contents of a csv file, or of the
+        review files of a directory written by the reviewstore.py
+        write_reviews_store function.
+    '''
+    if os.path.isdir(file_name):
+        names = sorted(glob.glob(os.path.join(file_name, 'reviews', 'part-*')))
+    else:
+        names = [file_name]
+    digest = hashlib.blake2b(digest_size=16)
+    for name in names:
+        digest.update(os.path.basename(name).encode('utf-8'))
+        with open(name, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def read_reviews_df(file_name):
+    '''
+        Read a csv file made by the review_scraper_driver.py
+        gen_csv_reviews_text function, or a directory written by the
+        reviewstore.py write_reviews_store function, as a pandas DataFrame.
+    '''
+    if os.path.isdir(file_name):
+        import reviewstore
+        return reviewstore.read_reviews_df(file_name)
+    return pd.read_csv(file_name)
+
+def make_train_test(reviews_text_csv, frac=0.4, seed=0, method='random', \
+                    cache_dir=None):
+    '''
+        A function which splits the reviews of a file into training and
+        test sets, as split does. If cache_dir is given, the sets are saved
+        there as Parquet files keyed by a checksum of the file and the split
+        arguments, and later calls with the same file and arguments read
+        them instead of parsing and splitting the file again.
+
+        Inputs:
+            reviews_text_csv: A str object as described in the
+                scores_data_analysis.py make_train_test function.
+
+            frac, seed, method: As in split.
+
+            cache_dir: A str object containing the name of a directory,
+                which is created if it does not exist, or None.
+
+        Returns:
+            df_train, df_test: As in split.
+    '''
+    if method not in METHODS:
+        raise ValueError(f'Unknown split method {method!r}.')
+    if cache_dir is None:
+        return split(read_reviews_df(reviews_text_csv), frac, seed, method)
+    key = f'{_checksum(reviews_text_csv)}-{method}-{frac}-{seed}' + \
+          f'-v{SPLIT_VERSION}'
+    train_file = os.path.join(cache_dir, f'{key}-train.parquet')
+    test_file = os.path.join(cache_dir, f'{key}-test.parquet')
+    if os.path.exists(train_file) and os.path.exists(test_file):
+        try:
+            return pd.read_parquet(train_file), pd.read_parquet(test_file)
+        except:
+            pass
+    df_train, df_test = split(read_reviews_df(reviews_text_csv), frac, seed, \
+                              method)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Files are written under temporary names and renamed, so a reader
+    # never finds half of a split.
+    for df, file_name in [(df_train, train_file), (df_test, test_file)]:
+        df.to_parquet(file_name + '.tmp', index=False)
+        os.replace(file_name + '.tmp', file_name)
+    return df_train, df_test
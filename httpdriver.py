@@ -0,0 +1,279 @@
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import etree, html
+import review_scraper_driver as rsd
+
+# Compiled once, and given the class or tag name as an XPath variable.
+CLASS_XPATH = etree.XPath(
+    ".//*[contains(concat(' ', normalize-space(@class), ' '), $name)]")
+TAG_XPATH = etree.XPath(".//*[name() = $tag]")
+USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64; rv:93.0) '
+              'Gecko/20100101 Firefox/93.0')
+
+class NoSuchElement(LookupError):
+    '''
+        Raised when a page has no element matching a search, as selenium's
+        NoSuchElementException is.
+    '''
+
+class CannotFollow(NoSuchElement):
+    '''
+        Raised when an element is clicked which only javascript can follow,
+        such as a "next" button without a link. The driver also records it
+        in its cannot_follow attribute, since crawl_reviews treats any error
+        as the end of paging.
+    '''
+
+def make_session(pool_size=10):
+    '''
+        A function which creates a requests session reusing up to pool_size
+        keep-alive connections per host.
+
+        Inputs:
+            pool_size: An int object specifying the number of connections
+                kept open per host.
+
+        Returns:
+            A requests.Session object.
+    '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+class HtmlElement:
+    '''
+        An element of a parsed page, offering the subset of the selenium
+        WebElement interface used by review_scraper_driver.py and
+        imdb_scraper.py, so their parsing functions work unchanged on pages
+        fetched over plain HTTP.
+
+        Inputs:
+            element: An lxml element.
+
+            driver: The HttpDriver object which loaded the page.
+    '''
+    def __init__(self, element, driver):
+        self.element = element
+        self.driver = driver
+
+    def find_elements_by_class_name(self, name):
+        return [HtmlElement(element, self.driver) \
+                for element in CLASS_XPATH(self.element, name=f' {name} ')]
+
+    def find_element_by_class_name(self, name):
+        elements = CLASS_XPATH(self.element, name=f' {name} ')
+        if not elements:
+            raise NoSuchElement(f'No element with class {name}.')
+        return HtmlElement(elements[0], self.driver)
+
+    def find_elements_by_tag_name(self, tag):
+        return [HtmlElement(element, self.driver) \
+                for element in TAG_XPATH(self.element, tag=tag)]
+
+    def find_element_by_tag_name(self, tag):
+        elements = TAG_XPATH(self.element, tag=tag)
+        if not elements:
+            raise NoSuchElement(f'No element with tag {tag}.')
+        return HtmlElement(elements[0], self.driver)
+
+    def get_attribute(self, name):
+        '''
+            Return an attribute of the element, or None. Links are made
+            absolute, as selenium makes them.
+        '''
+        value = self.element.get(name)
+        if value is not None and name in ('href', 'src'):
+            value = urljoin(self.driver.current_url, value)
+        return value
+
+    @property
+    def text(self):
+        '''
+            The text of the element with runs of whitespace collapsed, which
+            is close to the rendered text selenium returns.
+        '''
+        return ' '.join(self.element.text_content().split())
+
+    @property
+    def hidden(self):
+        '''
+            Whether the element is marked hidden or disabled, as Rotten
+            Tomatoes marks the "next" button on the last page of reviews.
+        '''
+        classes = (self.element.get('class') or '').split()
+        return 'hide' in classes or 'hidden' in classes or \
+               self.element.get('disabled') is not None or \
+               self.element.get('aria-disabled') == 'true'
+
+    def click(self):
+        '''
+            Follow the element's link. Buttons driven by javascript cannot be
+            followed without a browser, so they raise CannotFollow, which
+            ends paging in crawl_reviews, and set the driver's cannot_follow
+            attribute, so read_movie_info can retry with a browser.
+        '''
+        href = self.get_attribute('href')
+        if not href:
+            if self.hidden:
+                # As a browser cannot click it either, paging has ended.
+                raise NoSuchElement('The element is hidden or disabled.')
+            self.driver.cannot_follow = True
+            raise CannotFollow('The element has no link to follow.')
+        self.driver.get(href)
+
+class HttpDriver:
+    '''
+        A stand-in for a selenium Firefox driver which fetches pages over a
+        pooled keep-alive HTTP session and parses them with lxml, without
+        running javascript. It offers the driver methods used by
+        review_scraper_driver.py and imdb_scraper.py, and can be handed out
+        by a crawler.py DriverPool.
+
+        Inputs:
+            session: A requests.Session object, as returned by make_session,
+                which may be shared by many drivers. By default, each driver
+                makes its own, which is closed when the driver quits.
+
+            timeout: A float object specifying the seconds to wait for a
+                page.
+
+            throttle: A function called with each url before it is fetched,
+                such as a pipeline.py HostRateLimiter object, or None.
+
+            cache: A crawljournal.py CrawlJournal object in which fetched
+                pages are stored, or None. Stored pages are loaded from it
+                instead of being fetched.
+
+            revalidate: A boolean. If True, stored pages are fetched again
+                with their ETag, and the stored body is reused if the server
+                reports it unchanged.
+
+            cache_only: A boolean. If True, pages missing from the cache
+                raise a LookupError instead of being fetched.
+    '''
+    def __init__(self, session=None, timeout=30, throttle=None, cache=None, \
+                 revalidate=False, cache_only=False):
+        self._owns_session = session is None
+        self.session = session or make_session()
+        self.timeout = timeout
+        self.throttle = throttle
+        self.cache = cache
+        self.revalidate = revalidate
+        self.cache_only = cache_only
+        self.current_url = None
+        self.page_source = None
+        self.cannot_follow = False
+        self._root = None
+
+    def get(self, url):
+        '''
+            Fetch url, or load it from the cache, and parse it as the
+            current page.
+        '''
+        stored = self.cache.get_page(url) if self.cache else None
+        if stored and (self.cache_only or not self.revalidate):
+            final_url, _, body = stored
+            self.load(body, final_url)
+            return
+        if self.cache_only:
+            raise LookupError(f'{url} is not in the cache.')
+        headers = {}
+        if stored and stored[1]:
+            headers['If-None-Match'] = stored[1]
+        if self.throttle:
+            self.throttle(url)
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if stored and response.status_code == 304:
+            final_url, _, body = stored
+            self.load(body, final_url)
+            return
+        response.raise_for_status()
+        if self.cache:
+            self.cache.put_page(url, response.url, \
+                                response.headers.get('ETag'), response.content)
+        self.load(response.content, response.url)
+
+    def load(self, page_source, url):
+        '''
+            Parse a page which was saved or fetched elsewhere, such as an
+            html fixture, as the current page.
+
+            Inputs:
+                page_source: A str or bytes object containing the html.
+
+                url: A str object containing the url the page came from,
+                    used to make links absolute.
+        '''
+        self.current_url = url
+        self.page_source = page_source
+        self._root = html.fromstring(page_source)
+
+    def set_page_load_timeout(self, timeout):
+        self.timeout = timeout
+
+    def implicitly_wait(self, seconds):
+        # Pages are complete when fetched, so there is nothing to wait for.
+        pass
+
+    def quit(self):
+        if self._owns_session:
+            self.session.close()
+
+    def _page(self):
+        if self._root is None:
+            raise NoSuchElement('No page has been loaded.')
+        return HtmlElement(self._root, self)
+
+    def find_elements_by_class_name(self, name):
+        return self._page().find_elements_by_class_name(name)
+
+    def find_element_by_class_name(self, name):
+        return self._page().find_element_by_class_name(name)
+
+    def find_elements_by_tag_name(self, tag):
+        return self._page().find_elements_by_tag_name(tag)
+
+    def find_element_by_tag_name(self, tag):
+        return self._page().find_element_by_tag_name(tag)
+
+def read_movie_info(driver, movie_url, fallback_factory=None, \
+                    known_reviews=None):
+    '''
+        A function which reads a movie with driver, as the
+        review_scraper_driver.py read_movie_info function does, and falls
+        back to a browser when that finds nothing or when paging stopped at
+        a control only javascript can follow. This lets an HttpDriver
+        handle the pages it can, leaving pages which need javascript to
+        selenium.
+
+        Inputs:
+            driver: An HttpDriver or selenium driver object.
+
+            movie_url: A str object containing the url of the Rotten Tomatoes
+                page for a given movie.
+
+            fallback_factory: A function with no arguments which starts a
+                selenium driver, such as crawler.firefox_driver, or None for
+                no fallback.
+
+            known_reviews: As in the review_scraper_driver.py
+                read_movie_info function.
+
+        Returns:
+            As in the review_scraper_driver.py read_movie_info function.
+    '''
+    driver.cannot_follow = False
+    movie = rsd.read_movie_info(driver, movie_url, known_reviews)
+    if fallback_factory is None or \
+       (movie and movie[1][0] and not driver.cannot_follow):
+        return movie
+    fallback = fallback_factory()
+    try:
+        return rsd.read_movie_info(fallback, movie_url, known_reviews) \
+               or movie
+    finally:
+        fallback.quit()
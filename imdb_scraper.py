@@ -31,7 +31,7 @@ def find_imdb_scores_on_page(driver, imdb_scores):
             imdb_scores[title] = rating
         i += 1
 
-def crawl_imdb_movies(imdb_url):
+def crawl_imdb_movies(imdb_url, driver_factory=Firefox, journal=None):
     '''
         A function to generate the imdb_scores dictionary described above
         for a list of approximately 10000 movies.
@@ -40,23 +40,57 @@ def crawl_imdb_movies(imdb_url):
             imdb_url: A str object containing the url for a page with imdb
                 movies and scores.
 
+            driver_factory: A function with no arguments which starts a
+                driver. Passing httpdriver.HttpDriver fetches the pages over
+                plain HTTP instead of with a browser.
+
+            journal: A crawljournal.py CrawlJournal object, or None. The
+                scores and next url of each page are recorded in it as the
+                page is finished, and a crawl which was interrupted picks up
+                after the last recorded page.
+
         Returns:
             The imdb_scores dictionary object described above.
     '''
-    driver = Firefox()
-    driver.implicitly_wait(3)
-    driver.get(imdb_url)
     imdb_scores = {}
     # To terminate eventually just in case.
     i = 0
+    url = imdb_url
+    # Replay the pages finished by an earlier crawl.
+    page = journal.result('imdb', url) if journal else None
+    while page is not None and i < 10000:
+        for title, rating in page['scores'].items():
+            if not imdb_scores.get(title):
+                imdb_scores[title] = rating
+        if page['next'] is None:
+            return imdb_scores
+        url = page['next']
+        page = journal.result('imdb', url)
+        i += 1
+    driver = driver_factory()
+    driver.implicitly_wait(3)
+    driver.get(url)
     while i < 10000:
-        find_imdb_scores_on_page(driver, imdb_scores)
+        page_scores = {}
+        find_imdb_scores_on_page(driver, page_scores)
+        for title, rating in page_scores.items():
+            if not imdb_scores.get(title):
+                imdb_scores[title] = rating
         try:
             next_tag = driver.find_element_by_class_name('lister-page-next')
             next_url = next_tag.get_attribute('href')
+        except:
+            next_url = None
+        if journal:
+            journal.record('imdb', url, {'scores': page_scores, \
+                                         'next': next_url})
+        if next_url is None:
+            break
+        try:
             driver.get(next_url)
         except:
             break
+        url = next_url
         i += 1
     driver.quit()
     return imdb_scores
@@ -85,10 +119,11 @@ def gen_csv_imdb_scores(imdb_scores, file_name):
             row = [title] + [score]
             writer.writerow(row)
 
-def imdb_scores_csv(imdb_url, file_name):
+def imdb_scores_csv(imdb_url, file_name, driver_factory=Firefox, \
+                    journal=None):
     '''
         A function combining the previous two, which creates the desired
         csv file directly from the imdb url.
     '''
-    imdb_scores = crawl_imdb_movies(imdb_url)
+    imdb_scores = crawl_imdb_movies(imdb_url, driver_factory, journal)
     gen_csv_imdb_scores(imdb_scores, file_name)
\ No newline at end of file
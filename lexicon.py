@@ -0,0 +1,343 @@
+import mmap
+import struct
+from collections.abc import Mapping, ItemsView
+import numpy as np
+
+# Header of the binary lexicon format: magic bytes, format version, unused
+# padding, number of ngrams, and length in bytes of the ngram buffer.
+LEXICON_MAGIC = b'RTLX'
+LEXICON_VERSION = 1
+LEXICON_HEADER = struct.Struct('<4sHHQQ')
+
+class Lexicon:
+    '''
+        A compiled form of sentiment_strengths for scoring many reviews at
+        once. Every word appearing in an ngram of sentiment_strengths is
+        given an id by a vocabulary.py Vocabulary object (0 stands for words
+        it does not hold), unigram strengths are held in an array indexed by
+        id, and 2grams and 3grams are held in sorted arrays of the int64
+        keys the Vocabulary packs them into, alongside their strengths. A
+        batch of tokenized reviews is converted to one array of word ids,
+        and every ngram of every review is then looked up with array
+        operations rather than one dict probe at a time.
+
+        Inputs:
+            sentiment_strengths: A dict object, as described in the
+                sentimentanalyzer.py stratify function.
+
+            vocab: The Vocabulary object sentiment_strengths was built with,
+                so its words keep the ids they were given in training, or
+                None for a new one.
+    '''
+    def __init__(self, sentiment_strengths, vocab=None):
+        # Imported here, since vocabulary imports sentimentanalyzer, which
+        # imports this module.
+        from vocabulary import Vocabulary
+        self.sentiment_strengths = sentiment_strengths
+        self.vocab = Vocabulary() if vocab is None else vocab
+        # 'not' always needs an id, since it negates the following word
+        # whether or not it has a sentiment strength of its own.
+        self.not_id = self.vocab.add('not')
+        grams = []
+        for gram, score in sentiment_strengths.items():
+            grams.append(([self.vocab.add(word) for word in gram.split(' ')], \
+                          score))
+        # Words the Vocabulary is given later have no strength here.
+        self.size = len(self.vocab) + 1
+        self.unigrams = np.zeros(self.size, dtype=np.int64)
+        keys = {2: [], 3: []}
+        scores = {2: [], 3: []}
+        for ids, score in grams:
+            if len(ids) == 1:
+                self.unigrams[ids[0]] = score
+            elif len(ids) in keys:
+                keys[len(ids)].append(self.vocab.pack(ids))
+                scores[len(ids)].append(score)
+        # Longer ngrams are never matched by get_sentiment, so we drop them.
+        self.keys = {}
+        self.scores = {}
+        for n in keys:
+            n_keys = np.array(keys[n], dtype=np.int64)
+            order = np.argsort(n_keys)
+            self.keys[n] = n_keys[order]
+            self.scores[n] = np.array(scores[n], dtype=np.int64)[order]
+
+    def encode(self, token_lists):
+        '''
+            A method which converts tokenized reviews into word ids.
+
+            Inputs:
+                token_lists: A list object containing lists of tokens, as
+                    returned by the sentimentanalyzer.py tokenize function.
+
+            Returns:
+                A tuple of two numpy arrays holding the word id of every
+                    token of every review, 0 for words without one, and the
+                    position of its review in token_lists.
+        '''
+        ids, rows = self.vocab.encode(token_lists, add=False)
+        ids[ids >= self.size] = 0
+        return ids, rows
+
+    def score_tokens(self, token_lists):
+        '''
+            A method which computes the sentiment of many tokenized reviews,
+            as the sentimentanalyzer.py get_sentiment function would.
+
+            Inputs:
+                token_lists: A list object as described in encode.
+
+            Returns:
+                A numpy array of int64 containing the sentiment of each
+                    review.
+        '''
+        num_revs = len(token_lists)
+        ids, rows = self.encode(token_lists)
+        weights = self.unigrams[ids]
+        # Negate unigrams following 'not' within the same review.
+        negated = np.zeros(len(ids), dtype=bool)
+        negated[1:] = (ids[:-1] == self.not_id) & (rows[1:] == rows[:-1])
+        weights[negated] *= -1
+        sentiments = np.bincount(rows, weights=weights, minlength=num_revs)
+        for n in (2, 3):
+            if len(ids) < n or not len(self.keys[n]):
+                continue
+            # Ngrams must start and end in the same review. The keys of each
+            # length are searched separately, so a 3gram starting with an
+            # unknown word is never taken for a 2gram.
+            same_rev = rows[n - 1:] == rows[:len(rows) - n + 1]
+            packed = self.vocab.pack([ids[i : len(ids) - n + 1 + i] \
+                                      for i in range(n)])
+            pos = np.searchsorted(self.keys[n], packed)
+            pos[pos == len(self.keys[n])] = 0
+            found = (self.keys[n][pos] == packed) & same_rev
+            sentiments += np.bincount(rows[:len(packed)][found], \
+                                      weights=self.scores[n][pos[found]], \
+                                      minlength=num_revs)
+        return np.rint(sentiments).astype(np.int64)
+
+class NgramTrie:
+    '''
+        A compiled form of sentiment_strengths which matches ngrams by
+        walking a trie of words. Each node holds the strength of the ngram
+        ending there (0 if that ngram has no strength) and the words which
+        may follow it. Scoring walks each position of a review at most three
+        words deep and only visits ngrams which begin an ngram of the
+        lexicon, rather than joining and probing every possible ngram.
+        An NgramTrie may be passed to the sentimentanalyzer.py get_sentiment
+        function in place of sentiment_strengths.
+
+        Inputs:
+            sentiment_strengths: A dict object, as described in the
+                sentimentanalyzer.py stratify function.
+
+            max_n: An int object specifying the longest ngrams matched.
+                get_sentiment only considers ngrams of up to 3 words.
+    '''
+    def __init__(self, sentiment_strengths, max_n=3):
+        self.sentiment_strengths = sentiment_strengths
+        self.max_n = max_n
+        self.root = {}
+        for gram, score in sentiment_strengths.items():
+            words = gram.split(' ')
+            if len(words) > max_n:
+                continue
+            children = self.root
+            for word in words[:-1]:
+                node = children.get(word)
+                if node is None:
+                    node = children[word] = [0, {}]
+                children = node[1]
+            node = children.get(words[-1])
+            if node is None:
+                children[words[-1]] = [score, {}]
+            else:
+                node[0] = score
+
+    def score(self, tokens):
+        '''
+            A method which computes the sentiment of a tokenized review, as
+            the sentimentanalyzer.py get_sentiment function would.
+
+            Inputs:
+                tokens: A list object as returned by the sentimentanalyzer.py
+                    tokenize function.
+
+            Returns:
+                An int object representing the sentiment of the review.
+        '''
+        root = self.root
+        depth = self.max_n - 1
+        sentiment = 0
+        prev = None
+        for k, token in enumerate(tokens):
+            node = root.get(token)
+            if node is not None:
+                # Unigrams following 'not' are negated.
+                if prev == 'not':
+                    sentiment -= node[0]
+                else:
+                    sentiment += node[0]
+                for word in tokens[k + 1 : k + 1 + depth]:
+                    node = node[1].get(word)
+                    if node is None:
+                        break
+                    sentiment += node[0]
+            prev = token
+        return sentiment
+
+def write_lexicon(sentiment_strengths, file_name):
+    '''
+        A function which stores sentiment_strengths in the binary lexicon
+        format read by BinaryLexicon. After the header come the offsets of
+        each ngram in the ngram buffer (count + 1 little endian uint32s), the
+        scores (count int8s), and the buffer of utf-8 encoded ngrams sorted
+        by their encoding.
+
+        Inputs:
+            sentiment_strengths: A dict object, as described in the
+                sentimentanalyzer.py stratify function. Scores must fit in
+                an int8.
+
+            file_name: A str object containing the name of the file to be
+                created.
+
+        Returns:
+            Nothing is returned, but the file is created.
+    '''
+    encoded = sorted((gram.encode('utf-8'), score) \
+                     for gram, score in sentiment_strengths.items())
+    scores = np.array([score for _, score in encoded], dtype=np.int64)
+    if len(scores) and (scores.min() < -128 or scores.max() > 127):
+        raise ValueError('Sentiment scores must be between -128 and 127.')
+    lengths = np.array([len(gram) for gram, _ in encoded], dtype=np.int64)
+    if lengths.sum() >= 2 ** 32:
+        raise ValueError('The ngrams must take less than 4 GiB.')
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    offsets[1:] = np.cumsum(lengths)
+    with open(file_name, 'wb') as f:
+        f.write(LEXICON_HEADER.pack(LEXICON_MAGIC, LEXICON_VERSION, 0, \
+                                    len(encoded), int(offsets[-1])))
+        f.write(offsets.tobytes())
+        f.write(scores.astype(np.int8).tobytes())
+        f.write(b''.join(gram for gram, _ in encoded))
+
+class BinaryLexicon(Mapping):
+    '''
+        A read-only, dict-like view of a lexicon file written by
+        write_lexicon. The file is memory mapped, and the offsets and scores
+        are numpy arrays over the mapping, so loading copies nothing and
+        does no parsing. Looking up an ngram is a binary search over the
+        sorted ngram buffer.
+        A BinaryLexicon can be used wherever sentiment_strengths is read,
+        though Lexicon or NgramTrie objects compiled from it score faster
+        than repeated lookups.
+
+        Inputs:
+            file_name: A str object containing the name of the lexicon file.
+    '''
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, buffer_len = \
+            LEXICON_HEADER.unpack_from(self._mmap, 0)
+        if magic != LEXICON_MAGIC:
+            raise ValueError(f'{file_name} is not a lexicon file.')
+        if version != LEXICON_VERSION:
+            raise ValueError((f'{file_name} has lexicon format version '
+                              f'{version}, expected {LEXICON_VERSION}.'))
+        self._count = count
+        self._map_arrays()
+        if len(self._mmap) < self._start + buffer_len:
+            raise ValueError(f'{file_name} is truncated.')
+
+    def _map_arrays(self):
+        '''
+            Make the offsets and scores arrays over the mapping.
+        '''
+        start = LEXICON_HEADER.size
+        self.offsets = np.frombuffer(self._mmap, dtype='<u4', \
+                                     count=self._count + 1, offset=start)
+        start += 4 * (self._count + 1)
+        self.scores = np.frombuffer(self._mmap, dtype=np.int8, \
+                                    count=self._count, offset=start)
+        self._start = start + self._count
+
+    def _gram(self, i):
+        '''
+            Return the encoded ngram at position i.
+        '''
+        start = self._start
+        return self._mmap[start + int(self.offsets[i]) : \
+                          start + int(self.offsets[i + 1])]
+
+    def __getitem__(self, gram):
+        if not isinstance(gram, str):
+            raise KeyError(gram)
+        key = gram.encode('utf-8')
+        low = 0
+        high = self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._gram(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._count and self._gram(low) == key:
+            return int(self.scores[low])
+        raise KeyError(gram)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        start = self._start
+        offsets = self.offsets.tolist()
+        for i in range(self._count):
+            yield str(self._mmap[start + offsets[i] : start + offsets[i + 1]], \
+                      'utf-8')
+
+    def iter_items(self):
+        '''
+            Iterate over (ngram, score) tuples in one sequential pass,
+            rather than one binary search per ngram.
+        '''
+        return zip(iter(self), self.scores.tolist())
+
+    def items(self):
+        '''
+            Return an ItemsView of the lexicon, which may be iterated any
+            number of times, each time with iter_items.
+        '''
+        return _LexiconItems(self)
+
+    def close(self):
+        '''
+            Release the memory mapping. The offsets and scores arrays are
+            views of the mapping, and it cannot be released while any array
+            taken from them, such as a slice, is still referenced: BufferError
+            is then raised and the object stays open. Copy arrays which are
+            kept after closing.
+        '''
+        self.offsets = None
+        self.scores = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            self._map_arrays()
+            raise BufferError('The lexicon cannot be closed while arrays '
+                              'taken from its offsets or scores are in '
+                              'use.') from None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class _LexiconItems(ItemsView):
+    '''
+        The ItemsView of a BinaryLexicon, iterated in one sequential pass.
+    '''
+    def __iter__(self):
+        return self._mapping.iter_items()
@@ -0,0 +1,305 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import sentimentanalyzer as sa
+import vocabulary
+from vocabulary import Vocabulary, ngram_lengths
+from lexicon import write_lexicon, BinaryLexicon
+
+NS = (1, 2, 3)
+# Holds the file name of the current lexicon in a publish directory.
+CURRENT = 'CURRENT'
+
+def _review_key(rev):
+    '''
+        Return an 8 byte content hash of a review as an int object.
+    '''
+    return int.from_bytes(hashlib.blake2b(str(rev).encode('utf-8'), \
+                                          digest_size=8).digest(), 'little')
+
+def _top_keys(keys, counts, first, k):
+    '''
+        Return the keys of the k most frequently occurring ngrams of a count
+        table, in the order NgramDistribution.ranking gives them. Only the
+        ngrams occurring at least as often as the kth are sorted.
+    '''
+    if k <= 0:
+        return keys[:0]
+    if k < len(counts):
+        least = np.partition(counts, len(counts) - k)[len(counts) - k]
+        candidates = np.flatnonzero(counts >= least)
+        keys, counts, first = keys[candidates], counts[candidates], \
+                              first[candidates]
+    order = np.lexsort((first, ngram_lengths(keys), -counts))
+    return keys[order[:k]]
+
+class LexiconModel:
+    '''
+        An updatable sentiment analyzer model. The positive and negative
+        ngram counts of every review added so far are kept in tables sorted
+        by ngram key, so new labelled reviews are tokenized and merged in
+        without reading the old reviews again, and sentiment_strengths are
+        recomputed from the tables. Each ngram also keeps the position where
+        it first occurred, so ties are broken as a full rebuild breaks them:
+        a model given reviews in batches yields the same sentiment_strengths
+        as build_sentiment_strengths given them all at once. A review added
+        twice is counted once, keeping the label it was first added with,
+        so the two differ only if a later batch relabels a review. The
+        object may be shared by threads.
+
+        Inputs:
+            vocab: A Vocabulary object, or None for a new one.
+    '''
+    def __init__(self, vocab=None):
+        self.vocab = Vocabulary() if vocab is None else vocab
+        self.version = 0
+        empty = np.zeros(0, dtype=np.int64)
+        # For each label, the keys, counts and first positions of ngrams.
+        self.tables = {label: [empty, empty, empty] for label in (True, False)}
+        # For each label, the number of ngrams of each length seen so far.
+        self.offsets = {label: np.zeros(len(NS), dtype=np.int64) \
+                        for label in (True, False)}
+        self.seen = set()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_df(cls, df_train):
+        '''
+            Return a model of the training data df_train, as described in
+            the sentiment_analyzer_builder.py build_sentiment_strengths
+            function.
+        '''
+        model = cls()
+        model.add(sa.get_revs(df_train))
+        return model
+
+    def __len__(self):
+        return len(self.seen)
+
+    def add(self, revs):
+        '''
+            A method which adds labelled reviews to the model.
+
+            Inputs:
+                revs: A dict object as described in the sentimentanalyzer.py
+                    get_revs function, or an iterable of tuples of a review
+                    and its label.
+
+            Returns:
+                An int object containing the number of reviews added, which
+                    leaves out those already in the model.
+        '''
+        items = revs.items() if isinstance(revs, dict) else revs
+        with self._lock:
+            token_lists = {True: [], False: []}
+            for rev, is_pos in items:
+                key = _review_key(rev)
+                if key in self.seen:
+                    continue
+                self.seen.add(key)
+                token_lists[bool(is_pos)].append(sa.tokenize(rev))
+            for label, tokens in token_lists.items():
+                if tokens:
+                    self._merge(label, tokens)
+            added = len(token_lists[True]) + len(token_lists[False])
+            if added:
+                self.version += 1
+                self._cache.clear()
+            return added
+
+    def add_reviews(self, reviews):
+        '''
+            Add the reviews of a reviews object, as described in the
+            review_scraper_driver.py read_movie_page function, such as the
+            movies scraped by a daily refresh. Returns the number added.
+        '''
+        return self.add((rev, grade) for information in reviews.values() \
+                        for rev, grade in information[0].items())
+
+    def _merge(self, label, token_lists):
+        ids, rows = self.vocab.encode(token_lists)
+        batch = []
+        for i, n in enumerate(NS):
+            keys = Vocabulary.ngram_keys(ids, rows, n)
+            unique, first, counts = np.unique(keys, return_index=True, \
+                                              return_counts=True)
+            batch.append(np.stack([unique, counts.astype(np.int64), \
+                                   first + self.offsets[label][i]]))
+            self.offsets[label][i] += len(keys)
+        # Keys of different lengths never collide, so concatenating the
+        # lengths and sorting once gives the batch's table.
+        new_keys, new_counts, new_first = np.concatenate(batch, axis=1)
+        order = np.argsort(new_keys)
+        new_keys, new_counts, new_first = new_keys[order], \
+                                          new_counts[order], new_first[order]
+        keys, counts, first = self.tables[label]
+        at = np.searchsorted(keys, new_keys)
+        found = at < len(keys)
+        found[found] = keys[at[found]] == new_keys[found]
+        # Ngrams already counted keep their first position, which is always
+        # earlier than any position in the batch.
+        counts = counts.copy()
+        counts[at[found]] += new_counts[found]
+        at, new = at[~found], ~found
+        self.tables[label] = [np.insert(keys, at, new_keys[new]), \
+                              np.insert(counts, at, new_counts[new]), \
+                              np.insert(first, at, new_first[new])]
+
+    def _tops(self, alpha, n=None):
+        '''
+            Return the keys of the ngrams find_tops would select, restricted
+            to ngrams of length n if n is not None.
+        '''
+        tables = {}
+        for label, (keys, counts, first) in self.tables.items():
+            if n is not None:
+                keep = ngram_lengths(keys) == n
+                keys, counts, first = keys[keep], counts[keep], first[keep]
+            tables[label] = keys, counts, first
+        k = round(alpha * min(len(tables[True][0]), len(tables[False][0])))
+        top_pos = _top_keys(*tables[True], k)
+        top_neg = _top_keys(*tables[False], k)
+        shared = np.intersect1d(top_pos, top_neg)
+        return top_pos[~np.isin(top_pos, shared)], \
+               top_neg[~np.isin(top_neg, shared)]
+
+    def sentiment_strengths(self, alpha=sa.ALPHA):
+        '''
+            Return the sentiment_strengths dict object of the reviews added
+            so far, as the sentiment_analyzer_builder.py
+            build_sentiment_strengths function computes it. The result is
+            remembered until more reviews are added and must not be
+            modified.
+        '''
+        with self._lock:
+            key = ('all', alpha)
+            if key not in self._cache:
+                sentiment_strengths = {}
+                top_pos, top_neg = self._tops(alpha)
+                vocabulary.stratify(self.vocab, top_pos, top_neg, \
+                                    sentiment_strengths)
+                self._cache[key] = sentiment_strengths
+            return self._cache[key]
+
+    def sentiment_strengths_123grams(self, alphas=(sa.ALPHA_1, sa.ALPHA_2, \
+                                                   sa.ALPHA_3)):
+        '''
+            Return the sentiment_strengths dict object of the reviews added
+            so far, as the sentiment_analyzer_builder.py
+            build_sentiment_strengths_123grams function computes it. The
+            result is remembered until more reviews are added.
+        '''
+        with self._lock:
+            key = ('123grams', tuple(alphas))
+            if key not in self._cache:
+                sentiment_strengths = {}
+                for n, alpha in zip(NS, alphas):
+                    top_pos, top_neg = self._tops(alpha, n)
+                    vocabulary.stratify(self.vocab, top_pos, top_neg, \
+                                        sentiment_strengths)
+                self._cache[key] = sentiment_strengths
+            return self._cache[key]
+
+    ###################################################################
+    # Saving and Publishing
+    ###################################################################
+    def save(self, file_name):
+        '''
+            A method which stores the model in one .npz file, which is
+            written under a temporary name and renamed, so an earlier file
+            is replaced only once the new one is complete.
+        '''
+        with self._lock:
+            words = [token.encode('utf-8') for token in self.vocab.tokens[1:]]
+            arrays = {'version': np.array([self.version]), \
+                      'word_lengths': np.array([len(w) for w in words], \
+                                               dtype=np.int64), \
+                      'words': np.frombuffer(b''.join(words), dtype=np.uint8), \
+                      'seen': np.array(sorted(self.seen), dtype=np.uint64)}
+            for label, name in [(True, 'pos'), (False, 'neg')]:
+                for column, values in zip(['keys', 'counts', 'first'], \
+                                          self.tables[label]):
+                    arrays[f'{name}_{column}'] = values
+                arrays[f'{name}_offsets'] = self.offsets[label]
+            with open(file_name + '.tmp', 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(file_name + '.tmp', file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        '''
+            Return the model stored in file_name by save.
+        '''
+        with np.load(file_name) as arrays:
+            ends = np.cumsum(arrays['word_lengths']).tolist()
+            blob = arrays['words'].tobytes()
+            words = [blob[start : end].decode('utf-8') \
+                     for start, end in zip([0] + ends[:-1], ends)]
+            model = cls(Vocabulary(words))
+            model.version = int(arrays['version'][0])
+            model.seen = set(arrays['seen'].tolist())
+            for label, name in [(True, 'pos'), (False, 'neg')]:
+                model.tables[label] = [arrays[f'{name}_{column}'] \
+                                       for column in ['keys', 'counts', \
+                                                      'first']]
+                model.offsets[label] = arrays[f'{name}_offsets'].copy()
+        return model
+
+    def publish(self, directory, alpha=sa.ALPHA, keep=None):
+        '''
+            A method which writes the current sentiment_strengths to a new
+            binary lexicon file in directory and makes it the current
+            version. The lexicon is written under a temporary name and
+            renamed, and then the CURRENT file naming it is replaced the
+            same way, so readers of the directory always find a complete
+            lexicon, either the old one or the new one.
+
+            Inputs:
+                directory: A str object containing the name of the
+                    directory, which is created if it does not exist.
+
+                alpha: As in the sentimentanalyzer.py find_tops function.
+
+                keep: An int object of at least 1 specifying the number of
+                    lexicon files kept, most recent first, or None to keep
+                    them all.
+
+            Returns:
+                A str object containing the name of the new lexicon file.
+        '''
+        if keep is not None and keep < 1:
+            raise ValueError('At least the new lexicon must be kept.')
+        sentiment_strengths = self.sentiment_strengths(alpha)
+        os.makedirs(directory, exist_ok=True)
+        names = sorted(name for name in os.listdir(directory) \
+                       if name.startswith('lexicon-') and name.endswith('.bin'))
+        number = int(names[-1][8:-4]) + 1 if names else 1
+        name = f'lexicon-{number:06d}.bin'
+        file_name = os.path.join(directory, name)
+        write_lexicon(sentiment_strengths, file_name + '.tmp')
+        os.replace(file_name + '.tmp', file_name)
+        current = os.path.join(directory, CURRENT)
+        with open(current + '.tmp', 'w') as f:
+            f.write(name + '\n')
+        os.replace(current + '.tmp', current)
+        if keep is not None:
+            for old in names[:max(len(names) + 1 - keep, 0)]:
+                os.remove(os.path.join(directory, old))
+        return file_name
+
+def current_lexicon(directory):
+    '''
+        Return the name of the current lexicon file published to directory
+        by LexiconModel.publish.
+    '''
+    with open(os.path.join(directory, CURRENT)) as f:
+        return os.path.join(directory, f.read().strip())
+
+def load_published(directory):
+    '''
+        Return a BinaryLexicon object of the current lexicon published to
+        directory by LexiconModel.publish.
+    '''
+    return BinaryLexicon(current_lexicon(directory))
@@ -0,0 +1,213 @@
+import time
+import asyncio
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import review_scraper_driver as rsd
+import httpdriver
+
+class HostRateLimiter:
+    '''
+        A thread-safe limit on the rate of requests to each host. Calling
+        the object with a url blocks until a request to that url's host is
+        allowed, spacing requests to the same host evenly.
+
+        Inputs:
+            rate: A float object specifying the requests per second allowed
+                to a host without its own rate.
+
+            host_rates: A dict object mapping host names (such as
+                'www.rottentomatoes.com') to their requests per second.
+    '''
+    def __init__(self, rate=2.0, host_rates=None):
+        self.rate = rate
+        self.host_rates = host_rates or {}
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc
+        interval = 1 / self.host_rates.get(host, self.rate)
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + interval
+        if start > now:
+            time.sleep(start - now)
+
+def load_title(driver, url):
+    '''
+        Fetch a movie page with driver and read its title, or return None if
+        either fails.
+    '''
+    try:
+        driver.get(url)
+        return rsd.read_title(driver)
+    except:
+        return None
+
+async def discover_urls(all_movies_url, num_clicks):
+    '''
+        An async generator of the urls of movie pages found as in the
+        review_scraper_driver.py find_urls function, each yielded as soon
+        as the click of "Show More" displaying it is done, so crawl can
+        match titles while more movies are still being loaded. The browser
+        is driven in a worker thread of its own.
+
+        Inputs:
+            all_movies_url, num_clicks: As in find_urls.
+
+        Returns:
+            An async generator of str objects containing the urls of Rotten
+                Tomatoes pages to crawl.
+    '''
+    urls = rsd.iter_urls(all_movies_url, num_clicks)
+    loop = asyncio.get_running_loop()
+    # One thread, so the browser is closed only after the last call using
+    # it has returned, even if the generator is closed while one is running.
+    executor = ThreadPoolExecutor(1)
+    try:
+        while True:
+            url = await loop.run_in_executor(executor, next, urls, None)
+            if url is None:
+                return
+            yield url
+    finally:
+        await loop.run_in_executor(executor, urls.close)
+        executor.shutdown()
+
+async def crawl(urls, imdb_titles, match_workers=8, scrape_workers=4, \
+                queue_size=16, limiter=None, session=None, fuzzy=False):
+    '''
+        A coroutine which finds the movies of urls that also have IMDb data
+        and scrapes them, doing the work of the review_scraper_driver.py
+        find_matches and find_reviews functions as overlapping stages.
+        Urls stream into title matching, and matched movies stream into
+        review paging, through bounded queues, so a full queue holds back
+        the stage before it. Each movie page is fetched once: the page
+        loaded to read its title is handed on and scraped as it is. Pages
+        are fetched with httpdriver.HttpDriver objects in worker threads,
+        sharing one keep-alive session and one rate limiter.
+
+        Inputs:
+            urls: An iterable or async iterable of str objects containing the
+                urls of Rotten Tomatoes movie pages, such as the list
+                returned by find_urls, or discover_urls, which finds them
+                while earlier ones are matched. Urls are read as they are
+                needed.
+
+            imdb_titles: An iterable of IMDb movie titles.
+
+            match_workers, scrape_workers: int objects specifying the number
+                of pages each stage works on at once.
+
+            queue_size: An int object specifying the number of items each
+                queue holds before the stage feeding it waits.
+
+            limiter: A HostRateLimiter object. By default, each host is
+                sent 2 requests per second.
+
+            session: A requests.Session object shared by every fetch. By
+                default, one is made, and closed when crawl returns.
+
+            fuzzy: A boolean. Titles are matched as in the
+                review_scraper_driver.py find_matches function with the same
+                argument.
+
+        Returns:
+            The reviews dict object described in the review_scraper_driver.py
+                read_movie_page function, with movies in the order of urls.
+    '''
+    is_match = rsd.title_matcher(imdb_titles, fuzzy)
+    limiter = limiter or HostRateLimiter()
+    own_session = session is None
+    if own_session:
+        session = httpdriver.make_session(match_workers + scrape_workers)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(match_workers + scrape_workers)
+    match_queue = asyncio.Queue(queue_size)
+    scrape_queue = asyncio.Queue(queue_size)
+    results = {}
+
+    async def discover():
+        count = 0
+        if hasattr(urls, '__aiter__'):
+            async for url in urls:
+                await match_queue.put((count, url))
+                count += 1
+        else:
+            for url in urls:
+                await match_queue.put((count, url))
+                count += 1
+        for _ in range(match_workers):
+            await match_queue.put(None)
+
+    async def match():
+        while True:
+            item = await match_queue.get()
+            if item is None:
+                return
+            count, url = item
+            driver = httpdriver.HttpDriver(session, throttle=limiter)
+            title = await loop.run_in_executor(executor, load_title, \
+                                               driver, url)
+            if title is not None and is_match(title):
+                await scrape_queue.put((count, driver))
+
+    async def scrape():
+        while True:
+            item = await scrape_queue.get()
+            if item is None:
+                return
+            count, driver = item
+            try:
+                movie = await loop.run_in_executor( \
+                    executor, rsd.read_loaded_movie, driver)
+            except:
+                movie = None
+            if movie:
+                results[count] = movie
+
+    tasks = []
+    try:
+        tasks.append(asyncio.create_task(discover()))
+        tasks += [asyncio.create_task(match()) for _ in range(match_workers)]
+        scrapers = [asyncio.create_task(scrape()) \
+                    for _ in range(scrape_workers)]
+        tasks += scrapers
+        await asyncio.gather(*tasks[:1 + match_workers])
+        for _ in range(scrape_workers):
+            await scrape_queue.put(None)
+        await asyncio.gather(*scrapers)
+    finally:
+        # If a stage failed, the others are stopped and waited for, so no
+        # task is left waiting on a queue and no thread is left using the
+        # session once crawl returns.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(executor.shutdown, wait=True, \
+                                cancel_futures=True)
+        if own_session:
+            session.close()
+    reviews = {}
+    for count in sorted(results):
+        title, info = results[count]
+        reviews[title] = info
+    return reviews
+
+def get_reviews_and_scores(urls, imdb_titles, **kwargs):
+    '''
+        A pipelined version of the review_scraper_driver.py
+        get_reviews_and_scores function, which also does the work of
+        find_matches and generates the same csv files.
+
+        Inputs:
+            urls, imdb_titles, and the keyword arguments are as in crawl.
+
+        Returns:
+            Nothing is returned, but the csv files are generated.
+    '''
+    reviews = asyncio.run(crawl(urls, imdb_titles, **kwargs))
+    rsd.gen_csv(reviews, 'rottentomatoes.csv', sa_scores=False)
+    rsd.gen_csv_reviews_text(reviews, 'reviewstext.csv')
@@ -1,10 +1,18 @@
+import os
+import csv
+import multiprocessing
+from collections import deque
 import review_scraper_driver as rsd
 import sentimentanalyzer as sa
+from lexicon import Lexicon
+
+# The Lexicon object used by scoring worker processes.
+_LEXICON = None
 
 ###################################################################
 # Rescoring Movie
 ###################################################################
-def rescore_movie(movie_url, sentiment_strengths):
+def rescore_movie(movie_url, sentiment_strengths, cache=None):
     '''
         This function uses the constructed sentiment_strengths dictionary
         to rescore a movie using that movie's reviews.
@@ -16,6 +24,8 @@ def rescore_movie(movie_url, sentiment_strengths):
             sentiment_strengths: A dict object mapping words, bigrams, and
                 trigrams to values characterizing their association with
                 negative and positive reviews.
+
+            cache: A scorecache.py ScoreCache object, or None.
         
         Returns:
             Nothing is returned. However, this function prints the appropriate
@@ -26,16 +36,10 @@ def rescore_movie(movie_url, sentiment_strengths):
     rsd.read_movie_page(movie_url, reviews)
     if reviews:
         title, info = list(reviews.items())[0]
-        revs = info[0]
-        total_sentiment = 0
-        num_reviews = 0
-        for rev in revs.keys():
-            rev = str(rev)
-            raw_score = sa.get_sentiment(rev, sentiment_strengths)
-            sentiment = sa.normalize_score(raw_score)
-            total_sentiment += sentiment
-            num_reviews += 1
-        avg_sentiment = total_sentiment / num_reviews
+        revs = [str(rev) for rev in info[0].keys()]
+        raw_scores = sa.score_many(revs, sentiment_strengths, cache)
+        sentiments = sa.normalize_many(raw_scores).tolist()
+        avg_sentiment = sum(sentiments) / len(sentiments)
         print((f"Movie Title: {title},\tAudience Score: {info[1]},\t"
                f"Critic Score: {info[2]},\t"
                f"Sentiment Analyzer Score: {avg_sentiment: .2f}"))
@@ -46,7 +50,8 @@ def rescore_movie(movie_url, sentiment_strengths):
 # Adding Sentiment Scores.
 ###################################################################
 def add_sentiment_scores(scores_csv, reviews_csv, sentiment_strengths, \
-                         file_name, reviews=None):
+                         file_name, reviews=None, stream=False, processes=1, \
+                         cache=None):
     '''
         This function creates a csv with rows containing a movie title, that
         movie's audience score, its critic score, its Rotten Tomatoes rating,
@@ -68,28 +73,180 @@ def add_sentiment_scores(scores_csv, reviews_csv, sentiment_strengths, \
             reviews: The reviews dict object described in the
                 review_scraper_driver.py read_movie_page function.
                 If it is not passed in, we generate it.
+
+            stream: A boolean. If True and reviews is not passed in, the
+                reviews are read and scored a few movies at a time, as in
+                stream_sentiment_scores, rather than all loaded at once.
+
+            processes: An int object specifying the number of worker
+                processes scoring movies, as in score_movies. With 1, the
+                work is done in this process.
+
+            cache: A scorecache.py ScoreCache object, or None. It can only
+                be used with processes = 1.
         
         Returns:
             Nothing is returned. A csv file as described in the
                 the review_scraper_driver.py gen_csv function is created.
     '''
+    if not reviews and stream:
+        stream_sentiment_scores(scores_csv, reviews_csv, sentiment_strengths, \
+                                file_name, processes=processes, cache=cache)
+        return
     if not reviews:
         reviews = rsd.gen_revs_from_csvs(scores_csv, reviews_csv, False)
-    for movie, info in reviews.items():
-        revs = info[0]
+    # Movies are scored a chunk of reviews at a time, in this process or
+    # by workers.
+    movies = ((movie, info[0]) for movie, info in reviews.items())
+    for movie, sa_score in score_movies(movies, sentiment_strengths, \
+                                        processes, cache=cache):
+        reviews[movie] += [sa_score]
+    rsd.gen_csv(reviews, file_name, sa_scores=True)
+
+def _init_worker(lexicon):
+    '''
+        Give a worker process its copy of the Lexicon object when it cannot
+        be inherited by forking.
+    '''
+    global _LEXICON
+    _LEXICON = lexicon
+
+def _score_chunk(chunk, lexicon=None, cache=None, tokenizer=None):
+    '''
+        Compute the sentiment analyzer score of each movie in chunk, a list
+        of (title, reviews) tuples, scoring all of their reviews in one
+        batch. Worker processes use _LEXICON.
+    '''
+    lexicon = lexicon or _LEXICON
+    revs = [str(rev) for _, movie_revs in chunk for rev in movie_revs]
+    raw_scores = sa.score_many(revs, lexicon, cache, tokenizer)
+    sa_scores = sa.normalize_many(raw_scores).tolist()
+    results = []
+    start = 0
+    for title, movie_revs in chunk:
+        num_revs = len(movie_revs)
         # If there are no reviews, we make the sentiment analyzer score None.
-        if not revs:
-            info += [None]
-            reviews[movie] = info
+        if not num_revs:
+            results.append((title, None))
             continue
-        total_sa_score = 0
-        num_revs = 0
-        for rev in revs.keys():
-            rev = str(rev)
-            raw_score = sa.get_sentiment(rev, sentiment_strengths)
-            sa_score = sa.normalize_score(raw_score)
-            total_sa_score += sa_score
-            num_revs += 1
-        info += [str(total_sa_score / num_revs)]
-        reviews[movie] = info
-    rsd.gen_csv(reviews, file_name, sa_scores=True)
\ No newline at end of file
+        total_sa_score = sum(sa_scores[start : start + num_revs])
+        start += num_revs
+        results.append((title, str(total_sa_score / num_revs)))
+    return results
+
+def _chunk_movies(movies, chunk_size):
+    '''
+        Group (title, reviews) tuples into lists holding at least chunk_size
+        reviews, or the rest of movies.
+    '''
+    chunk = []
+    num_revs = 0
+    for title, movie_revs in movies:
+        chunk.append((title, list(movie_revs)))
+        num_revs += len(movie_revs)
+        if num_revs >= chunk_size:
+            yield chunk
+            chunk = []
+            num_revs = 0
+    if chunk:
+        yield chunk
+
+def score_movies(movies, sentiment_strengths, processes=1, chunk_size=10000, \
+                 cache=None, tokenizer=None):
+    '''
+        A generator which computes the sentiment analyzer score of each
+        movie, as add_sentiment_scores does. Movies are grouped into chunks
+        of at least chunk_size reviews, and with several processes the
+        chunks are scored by a pool of worker processes which share one
+        compiled Lexicon (inherited by forking where possible, so it is
+        never copied). At most two chunks per process are in flight, so
+        movies can be read lazily without holding them all in memory.
+
+        Inputs:
+            movies: An iterable of tuples containing a movie title and an
+                iterable of the text of its reviews.
+
+            sentiment_strengths: A dict object as described in rescore_movie,
+                or a Lexicon object compiled from one.
+
+            processes: An int object specifying the number of worker
+                processes, or None for one per core. With 1, the work is
+                done in this process.
+
+            chunk_size: An int object specifying the number of reviews sent
+                to a worker at once.
+
+            cache: A scorecache.py ScoreCache object, or None. Caches cannot
+                be shared with worker processes, so one can only be used
+                with processes = 1.
+
+            tokenizer: As in the sentimentanalyzer.py score_many function.
+                Worker processes always use tokenize.
+
+        Returns:
+            A generator of tuples containing each movie title and its score
+                as a str object (None for a movie without reviews), in the
+                order of movies.
+    '''
+    global _LEXICON
+    if not isinstance(sentiment_strengths, Lexicon):
+        sentiment_strengths = Lexicon(sentiment_strengths)
+    chunks = _chunk_movies(movies, chunk_size)
+    processes = processes or os.cpu_count()
+    if processes == 1:
+        for chunk in chunks:
+            yield from _score_chunk(chunk, sentiment_strengths, cache, \
+                                    tokenizer)
+        return
+    if cache is not None:
+        raise ValueError('A cache can only be used with processes = 1.')
+    context = multiprocessing.get_context()
+    if context.get_start_method() == 'fork':
+        _LEXICON = sentiment_strengths
+        pool = context.Pool(processes)
+    else:
+        pool = context.Pool(processes, _init_worker, (sentiment_strengths,))
+    with pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_score_chunk, (chunk,)))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+def stream_sentiment_scores(scores_csv, reviews_csv, sentiment_strengths, \
+                            file_name, chunk_size=10000, processes=1, \
+                            cache=None):
+    '''
+        This function creates the same csv file as add_sentiment_scores
+        while holding only a few movies' reviews in memory. Movies are read
+        from reviews_csv one at a time and scored in chunks of at least one
+        whole movie, and each movie's row is written as soon as it is
+        scored, with its scores looked up in an index of scores_csv. Memory
+        use is bounded by chunk_size or the largest movie, whichever is
+        larger, rather than by the whole corpus.
+
+        Inputs:
+            scores_csv, reviews_csv, sentiment_strengths, and file_name are
+                as in add_sentiment_scores. The reviews of each movie must be
+                on consecutive rows of reviews_csv, as the
+                review_scraper_driver.py gen_csv_reviews_text function writes
+                them.
+
+            chunk_size, processes, cache: As in score_movies. Each worker
+                process adds two chunks to the reviews held in memory.
+
+        Returns:
+            Nothing is returned. A csv file as described in the
+                the review_scraper_driver.py gen_csv function is created.
+    '''
+    index = rsd.read_scores_index(scores_csv, False)
+    movies = rsd.iter_movie_reviews(reviews_csv)
+    with open(file_name, 'w') as csvfile:
+        writer = csv.writer(csvfile, delimiter = ',')
+        writer.writerow(['Title', 'Audience Score', 'Tomatometer Score', \
+                         'Rating', 'SA Score'])
+        for title, sa_score in score_movies(movies, sentiment_strengths, \
+                                            processes, chunk_size, cache):
+            writer.writerow([title] + index.get(title, []) + [sa_score])
@@ -1,5 +1,7 @@
 import csv
+from itertools import groupby
 from selenium.webdriver import Firefox
+from titleindex import TitleIndex
 
 #########################################################################
 # Crawling Rotten Tomatoes
@@ -39,7 +41,7 @@ def read_reviews_page(driver, reviews_and_scores):
         except:
             continue
 
-def crawl_reviews(driver, reviews_url, page_count=50):
+def crawl_reviews(driver, reviews_url, page_count=50, known=None):
     '''
         This function processes all critic reviews on the Rotten Tomatoes
         website associated with a single movie. We obtain a dict object
@@ -56,6 +58,11 @@ def crawl_reviews(driver, reviews_url, page_count=50):
                 pages to crawl. 20 reviews can be displayed on each page,
                 so we will obtain a maximum of 1020 reviews for a given movie
                 by default.
+
+            known: A collection of the texts of reviews already scraped for
+                this movie, or None. Reviews are listed newest first, so
+                paging stops after the first page holding a known review,
+                and only reviews newer than those are returned.
             
         Returns:
             The reviews_and_scores dict object which maps the text of each
@@ -76,7 +83,14 @@ def crawl_reviews(driver, reviews_url, page_count=50):
     more_reviews = True
     count = 0
     while more_reviews and count <= page_count:
-        read_reviews_page(driver, reviews_and_scores)
+        if known:
+            page = {}
+            read_reviews_page(driver, page)
+            reviews_and_scores.update(page)
+            if any(review in known for review in page):
+                break
+        else:
+            read_reviews_page(driver, reviews_and_scores)
         try:
             driver.find_element_by_class_name('js-prev-next-paging-next') \
                   .click()
@@ -85,7 +99,89 @@ def crawl_reviews(driver, reviews_url, page_count=50):
         count += 1
     return reviews_and_scores
 
-def read_movie_page(movie_url, reviews):
+def read_title(driver):
+    '''
+        Read the title of the movie on the page loaded by driver.
+
+        Inputs:
+            driver: A selenium.webdriver Firefox object, with the url of a
+                Rotten Tomatoes movie page already passed in.
+
+        Returns:
+            A str object containing the title. An exception is raised if the
+                page has no scoreboard.
+    '''
+    scoreboard = driver.find_element_by_class_name('thumbnail-scoreboard-wrap')
+    title_tag = scoreboard.find_element_by_tag_name('button')
+    return title_tag.get_attribute('data-title')
+
+def read_loaded_movie(driver, known_reviews=None):
+    '''
+        This function collects all of the information we want for the movie
+        whose page is already loaded by driver, so a page fetched to check
+        its title does not have to be fetched again.
+
+        Inputs:
+            driver: A selenium.webdriver Firefox object, with the url of a
+                Rotten Tomatoes movie page already passed in.
+
+            known_reviews: As in read_movie_info.
+
+        Returns:
+            As in read_movie_info.
+    '''
+    try:
+        scoreboard = driver.find_element_by_class_name('thumbnail-scoreboard-wrap')
+        title_tag = scoreboard.find_element_by_tag_name('button')
+        title = title_tag.get_attribute('data-title')
+        ratings = scoreboard.find_element_by_tag_name('score-board')
+        audience_score = ratings.get_attribute('audiencescore')
+        tomatometer_score = ratings.get_attribute('tomatometerscore')
+        grade = ratings.get_attribute('tomatometerstate')
+        revs = driver.find_element_by_class_name('view_all_critic_reviews')
+        reviews_url = revs.get_attribute('href')
+    except:
+        return None
+    known = known_reviews.get(title) if known_reviews else None
+    if known:
+        known = known[0].keys()
+    return title, [crawl_reviews(driver, reviews_url, known=known), \
+                   audience_score, tomatometer_score, grade]
+
+def read_movie_info(driver, movie_url, known_reviews=None):
+    '''
+        This function collects all of the information we want for a single
+        movie using a driver which is already running, so that a driver can
+        be reused for many movies.
+
+        Inputs:
+            driver: A selenium.webdriver Firefox object.
+
+            movie_url: A str object containing the url of the Rotten Tomatoes
+                page for a given movie.
+
+            known_reviews: A reviews dict object, as described in
+                read_movie_page, from an earlier crawl, or None. If the movie
+                is in it, only reviews newer than its known reviews are read,
+                as in crawl_reviews.
+
+        Returns:
+            A tuple containing the title of the movie and the list object
+                described in read_movie_page, or None if the page could not
+                be read.
+    '''
+    try:
+        driver.get(movie_url)
+        driver.set_page_load_timeout(30)
+    except:
+        try:
+            driver.get(movie_url)
+            driver.set_page_load_timeout(30) 
+        except:
+            return None
+    return read_loaded_movie(driver, known_reviews)
+
+def read_movie_page(movie_url, reviews, known_reviews=None):
     '''
         This function collects all of the information we want
         for a single movie.
@@ -98,6 +194,8 @@ def read_movie_page(movie_url, reviews):
                 containing the reviews_and_scores dictionary described above,
                 the audience score for the movie, the critic score fo the
                 movie, and the Rotten Tomatoes grade for the movie.
+
+            known_reviews: As in read_movie_info.
         
         Returns:
             Nothing is returned by this function. The reviews dictionary
@@ -106,31 +204,12 @@ def read_movie_page(movie_url, reviews):
     driver = Firefox()
     driver.implicitly_wait(3)
     try:
-        driver.get(movie_url)
-        driver.set_page_load_timeout(30)
-    except:
-        try:
-            driver.get(movie_url)
-            driver.set_page_load_timeout(30) 
-        except:
-            driver.quit()
-            return
-    try:
-        scoreboard = driver.find_element_by_class_name('thumbnail-scoreboard-wrap')
-        title_tag = scoreboard.find_element_by_tag_name('button')
-        title = title_tag.get_attribute('data-title')
-        ratings = scoreboard.find_element_by_tag_name('score-board')
-        audience_score = ratings.get_attribute('audiencescore')
-        tomatometer_score = ratings.get_attribute('tomatometerscore')
-        grade = ratings.get_attribute('tomatometerstate')
-        revs = driver.find_element_by_class_name('view_all_critic_reviews')
-        reviews_url = revs.get_attribute('href')
-    except:
+        movie = read_movie_info(driver, movie_url, known_reviews)
+    finally:
         driver.quit()
-        return
-    reviews[title] = [crawl_reviews(driver, reviews_url), audience_score, \
-                      tomatometer_score, grade]
-    driver.quit()
+    if movie:
+        title, info = movie
+        reviews[title] = info
 
 def find_urls(all_movies_url, num_clicks):
     '''
@@ -149,26 +228,57 @@ def find_urls(all_movies_url, num_clicks):
         
         Returns: A list of urls of Rotten Tomatoes pages to crawl.
     '''
+    return list(iter_urls(all_movies_url, num_clicks))
+
+def iter_urls(all_movies_url, num_clicks):
+    '''
+        A generator version of find_urls, which yields the urls of the
+        movies shown before the first click of "Show More" and after each
+        click, rather than all of them after the last click. The browser is
+        closed when the generator finishes or is closed.
+
+        Inputs:
+            all_movies_url, num_clicks: As in find_urls.
+
+        Returns:
+            A generator of str objects containing the urls of Rotten
+                Tomatoes pages to crawl, in the order find_urls lists them.
+    '''
     driver = Firefox()
-    driver.get(all_movies_url)
-    driver.implicitly_wait(3)
-    clicks = 0
-    more_movies = driver.find_element_by_class_name('btn-secondary-rt')
-    while clicks < num_clicks:
-        clicks += 1
-        try:
-            more_movies.click()
-        except:
-            break
-    movies = driver.find_elements_by_class_name('mb-movie')
-    url_list = []
-    for movie in movies:
-        movie_url = movie.find_element_by_tag_name('a').get_attribute('href')
-        url_list.append(movie_url)
-    driver.quit()
-    return url_list
+    try:
+        driver.get(all_movies_url)
+        driver.implicitly_wait(3)
+        clicks = 0
+        found = 0
+        more_movies = driver.find_element_by_class_name('btn-secondary-rt')
+        while True:
+            # Each click adds movies after those already shown.
+            movies = driver.find_elements_by_class_name('mb-movie')
+            for movie in movies[found:]:
+                yield movie.find_element_by_tag_name('a').get_attribute('href')
+            found = len(movies)
+            if clicks >= num_clicks:
+                break
+            clicks += 1
+            try:
+                more_movies.click()
+            except:
+                break
+    finally:
+        driver.quit()
 
-def find_matches(imdb_titles, url_list):
+def title_matcher(imdb_titles, fuzzy=False):
+    '''
+        Return a function which tells whether a Rotten Tomatoes title is one
+        of imdb_titles, matching as described in find_matches.
+    '''
+    if fuzzy:
+        index = TitleIndex(imdb_titles)
+        return lambda title: index.match(title) is not None
+    imdb_titles = set(imdb_titles)
+    return lambda title: title in imdb_titles
+
+def find_matches(imdb_titles, url_list, fuzzy=False):
     '''
         A function to find which urls correspond to movies for which I also
         have data from IMDb, since these are the movies I am interested in.
@@ -177,11 +287,17 @@ def find_matches(imdb_titles, url_list):
             imdb_titles: list object of imdb movie titles.
 
             url_list: list object of Rotten Tomatoes movie pages to crawl.
+
+            fuzzy: A boolean. If True, titles are matched as in the
+                titleindex.py TitleIndex match method, allowing for
+                differences in punctuation, years, articles and spelling.
+                Otherwise titles must be identical.
         
         Returns:
             A list object containing the urls of Rotten Tomatoes movie pages
                 for which I also have IMDb data.
     '''
+    is_match = title_matcher(imdb_titles, fuzzy)
     urls = []
     for url in url_list:
         try:
@@ -189,10 +305,8 @@ def find_matches(imdb_titles, url_list):
             driver.implicitly_wait(3)
             driver.get(url)
             driver.set_page_load_timeout(30)
-            scoreboard = driver.find_element_by_class_name('thumbnail-scoreboard-wrap')
-            title_tag = scoreboard.find_element_by_tag_name('button')
-            title = title_tag.get_attribute('data-title')
-            if title in imdb_titles:
+            title = read_title(driver)
+            if is_match(title):
                 urls.append(url)
             driver.quit()
         except:
@@ -200,7 +314,7 @@ def find_matches(imdb_titles, url_list):
             continue
     return urls
 
-def find_reviews(url_list):
+def find_reviews(url_list, journal=None, known_reviews=None):
     '''
         This function generates the reviews dictionary described above from
         from the Rotten Tomatoes page containing all movies with information
@@ -209,16 +323,33 @@ def find_reviews(url_list):
         Inputs:
             url_list: A list object containing strings with the urls of movie
                 pages that we will scrape.
+
+            journal: A crawljournal.py CrawlJournal object, or None. Each
+                movie read is recorded in it as soon as it is finished, and
+                movies already recorded are taken from it rather than
+                scraped again, so an interrupted crawl can be resumed.
+
+            known_reviews: As in read_movie_info.
         
         Returns:
             The reviews dict object described in read_movie_page.
     '''
     reviews = {}
     for url in url_list:
-        try:
-            read_movie_page(url, reviews)
-        except:
-            continue
+        movie = journal.result('movie', url) if journal else None
+        if movie is None:
+            movie_reviews = {}
+            try:
+                read_movie_page(url, movie_reviews, known_reviews)
+            except:
+                continue
+            if not movie_reviews:
+                continue
+            movie = list(movie_reviews.items())[0]
+            if journal:
+                journal.record('movie', url, movie)
+        title, info = movie
+        reviews[title] = info
     return reviews
 
 def get_reviews_and_scores(url_list):
@@ -235,6 +366,56 @@ def get_reviews_and_scores(url_list):
     gen_csv(reviews, 'rottentomatoes.csv', sa_scores=False)
     gen_csv_reviews_text(reviews, 'reviewstext.csv')
 
+def merge_reviews(reviews, new_reviews):
+    '''
+        A function which adds the reviews found by an incremental crawl to
+        the reviews of an earlier crawl. New reviews are placed ahead of the
+        known reviews of their movie, keeping reviews newest first, so the
+        first review stored for a movie is always the newest one seen. The
+        scores and grade of a movie are replaced by the newly read ones.
+
+        Inputs:
+            reviews: A dict object as described in read_movie_page, without
+                sentiment analyzer scores.
+
+            new_reviews: A dict object as described in read_movie_page, as
+                returned by find_reviews with reviews as known_reviews.
+
+        Returns:
+            Nothing is returned. reviews is modified in place.
+    '''
+    for title, information in new_reviews.items():
+        old = reviews.get(title)
+        if old:
+            reviews_and_scores = dict(information[0])
+            for review, grade in old[0].items():
+                reviews_and_scores.setdefault(review, grade)
+            information = [reviews_and_scores] + information[1:]
+        reviews[title] = information
+
+def refresh_reviews_and_scores(url_list, scores_csv='rottentomatoes.csv', \
+                               reviews_csv='reviewstext.csv'):
+    '''
+        This function updates the csv files generated by
+        get_reviews_and_scores with the reviews written since they were
+        made. Movies already in the csv files are only paged until their
+        known reviews are reached, which is usually the first page, rather
+        than through every page of reviews.
+
+        Inputs:
+            url_list: list object described in find_reviews
+
+            scores_csv, reviews_csv: str objects containing the names of the
+                csv files to update, as described in gen_revs_from_csvs.
+
+        Returns:
+            Nothing is returned, but the csv files are rewritten.
+    '''
+    reviews = gen_revs_from_csvs(scores_csv, reviews_csv, sa_scores=False)
+    merge_reviews(reviews, find_reviews(url_list, known_reviews=reviews))
+    gen_csv(reviews, scores_csv, sa_scores=False)
+    gen_csv_reviews_text(reviews, reviews_csv)
+
 ##################################################################
 # Storing Data.
 ##################################################################
@@ -341,3 +522,52 @@ def gen_revs_from_csvs(scores_csv, reviews_csv, sa_scores):
                     sa_score = line[4]
                     info += [sa_score]
     return reviews
+
+def iter_movie_reviews(reviews_csv):
+    '''
+        A function which reads the csv file created using
+        gen_csv_reviews_text one movie at a time, so only the reviews of a
+        single movie are held in memory. The reviews of a movie must be on
+        consecutive rows, as gen_csv_reviews_text writes them.
+
+        Inputs:
+            reviews_csv: A str object as described in gen_revs_from_csvs.
+
+        Returns:
+            A generator of tuples containing a movie title and the
+                reviews_and_scores dict object described in crawl_reviews,
+                in the order the movies appear in reviews_csv. A ValueError
+                is raised if the reviews of a movie are not consecutive.
+    '''
+    seen = set()
+    with open(reviews_csv, 'r') as f:
+        csv_file = csv.reader(f)
+        # Ignore headers.
+        next(csv_file)
+        for title, lines in groupby(csv_file, key=lambda line: line[0]):
+            if title in seen:
+                raise ValueError((f'The reviews of {title} are not on '
+                                  f'consecutive rows of {reviews_csv}.'))
+            seen.add(title)
+            yield title, {line[1]: line[2] == 'True' for line in lines}
+
+def read_scores_index(scores_csv, sa_scores):
+    '''
+        A function which indexes the csv file created using gen_csv by
+        title, without reading any reviews.
+
+        Inputs:
+            scores_csv, sa_scores: As in gen_revs_from_csvs.
+
+        Returns:
+            A dict object mapping each title to the list object of scores
+                gen_revs_from_csvs would add after its reviews.
+    '''
+    index = {}
+    with open(scores_csv, 'r') as f:
+        csv_file = csv.reader(f)
+        next(csv_file)
+        for line in csv_file:
+            info = index.setdefault(line[0], [])
+            info += line[1:5] if sa_scores else line[1:4]
+    return index
@@ -0,0 +1,222 @@
+import os
+import glob
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
+
+# File extension for each storage format.
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+SCORE_COLUMNS = ['Title', 'Audience Score', 'Tomatometer Score', 'Rating']
+
+#########################################################################
+# Writing
+#########################################################################
+def _score_text(value):
+    '''
+        Convert a score to the str object a csv file would hold for it.
+    '''
+    return '' if value is None else str(value)
+
+def _write_table(table, file_name, file_format):
+    if file_format == 'parquet':
+        pq.write_table(table, file_name)
+    else:
+        feather.write_feather(table, file_name, compression='uncompressed')
+
+def write_reviews_store(reviews, directory, sa_scores, file_format='parquet', \
+                        rows_per_file=1000000):
+    '''
+        A function which stores the reviews object in columnar files holding
+        the same data as the csv files made by the review_scraper_driver.py
+        gen_csv and gen_csv_reviews_text functions. Reviews go to numbered
+        files in directory/reviews, each holding the reviews of whole movies
+        and at most about rows_per_file rows, with titles dictionary encoded
+        and labels stored as booleans. Scores go to one file in directory.
+
+        Inputs:
+            reviews: A dict object as described in the
+                review_scraper_driver.py read_movie_page function.
+
+            directory: A str object containing the name of the directory to
+                be created. Files of an earlier store there are replaced.
+
+            sa_scores: A boolean indicating whether sentiment analyzer scores
+                have been added to the reviews object.
+
+            file_format: 'parquet' for Parquet files, or 'arrow' for
+                uncompressed Arrow IPC files, which load fastest.
+
+            rows_per_file: An int object specifying the number of reviews
+                after which a new file is started.
+
+        Returns:
+            Nothing is returned, but the files are created.
+    '''
+    extension = EXTENSIONS[file_format]
+    reviews_dir = os.path.join(directory, 'reviews')
+    os.makedirs(reviews_dir, exist_ok=True)
+    for name in glob.glob(os.path.join(reviews_dir, 'part-*')) + \
+                glob.glob(os.path.join(directory, 'scores.*')):
+        os.remove(name)
+    schema = pa.schema([('Title', pa.dictionary(pa.int32(), pa.string())), \
+                        ('Review', pa.string()), \
+                        ('Review is Positive', pa.bool_())])
+    part = 0
+    titles = []
+    texts = []
+    grades = []
+
+    def flush():
+        table = pa.table([pa.array(titles).dictionary_encode(), \
+                          pa.array(texts, type=pa.string()), \
+                          pa.array(grades, type=pa.bool_())], schema=schema)
+        _write_table(table, os.path.join(reviews_dir, \
+                                         f'part-{part:05d}{extension}'), \
+                     file_format)
+
+    for title, information in reviews.items():
+        reviews_and_scores = information[0]
+        titles += [title] * len(reviews_and_scores)
+        texts += reviews_and_scores.keys()
+        grades += map(bool, reviews_and_scores.values())
+        if len(texts) >= rows_per_file:
+            flush()
+            part += 1
+            titles, texts, grades = [], [], []
+    if texts or part == 0:
+        flush()
+    columns = SCORE_COLUMNS + ['SA Score'] if sa_scores else SCORE_COLUMNS
+    scores = {column: [] for column in columns}
+    for title, information in reviews.items():
+        scores['Title'].append(title)
+        for column, value in zip(columns[1:], information[1:]):
+            scores[column].append(_score_text(value))
+    table = pa.table({column: pa.array(values, type=pa.string()) \
+                      for column, values in scores.items()})
+    _write_table(table, os.path.join(directory, 'scores' + extension), \
+                 file_format)
+
+#########################################################################
+# Reading
+#########################################################################
+def _read_table(file_name):
+    if file_name.endswith(EXTENSIONS['parquet']):
+        return pq.read_table(file_name)
+    return feather.read_table(file_name, memory_map=True)
+
+def read_reviews_table(directory):
+    '''
+        Return a pyarrow Table of every review in a store written by
+        write_reviews_store, in the order they were written.
+    '''
+    names = sorted(glob.glob(os.path.join(directory, 'reviews', 'part-*')))
+    if not names:
+        raise FileNotFoundError(f'{directory} holds no reviews.')
+    return pa.concat_tables([_read_table(name) for name in names])
+
+def read_scores_table(directory):
+    '''
+        Return a pyarrow Table of the scores in a store written by
+        write_reviews_store.
+    '''
+    names = glob.glob(os.path.join(directory, 'scores.*'))
+    if not names:
+        raise FileNotFoundError(f'{directory} holds no scores.')
+    return _read_table(names[0])
+
+def read_reviews_df(directory):
+    '''
+        A function which reads the reviews in a store as a pandas DataFrame
+        with the columns, and the values, pd.read_csv returns for the csv
+        file made by gen_csv_reviews_text.
+
+        Inputs:
+            directory: A str object containing the name of the store.
+
+        Returns:
+            A pandas DataFrame object.
+    '''
+    df = read_reviews_table(directory).to_pandas()
+    df['Title'] = df['Title'].astype(str)
+    return df
+
+def iter_reviews_dfs(directory, chunksize=100000):
+    '''
+        A generator which reads the reviews in a store as pandas DataFrame
+        objects of at most chunksize rows, like those read_reviews_df
+        returns, holding only one chunk in memory at a time.
+    '''
+    names = sorted(glob.glob(os.path.join(directory, 'reviews', 'part-*')))
+    if not names:
+        raise FileNotFoundError(f'{directory} holds no reviews.')
+    for name in names:
+        if name.endswith(EXTENSIONS['parquet']):
+            batches = pq.ParquetFile(name).iter_batches(batch_size=chunksize)
+        else:
+            batches = _read_table(name).to_batches(max_chunksize=chunksize)
+        for batch in batches:
+            df = batch.to_pandas()
+            df['Title'] = df['Title'].astype(str)
+            yield df
+
+def read_scores_df(directory):
+    '''
+        A function which reads the scores in a store as a pandas DataFrame,
+        converting numeric columns as pd.read_csv does for the csv file made
+        by gen_csv.
+
+        Inputs:
+            directory: A str object containing the name of the store.
+
+        Returns:
+            A pandas DataFrame object.
+    '''
+    df = read_scores_table(directory).to_pandas()
+    for column in df.columns[1:]:
+        values = df[column].mask(df[column] == '')
+        try:
+            df[column] = pd.to_numeric(values)
+        except ValueError:
+            df[column] = values
+    return df
+
+def read_reviews(directory, sa_scores):
+    '''
+        A function which creates a reviews object from a store, as the
+        review_scraper_driver.py gen_revs_from_csvs function does from the
+        csv files.
+
+        Inputs:
+            directory: A str object containing the name of the store.
+
+            sa_scores: A boolean indicating whether sentiment analyzer scores
+                should be read.
+
+        Returns:
+            The dict object reviews, as described in the
+                review_scraper_driver.py read_movie_page function.
+    '''
+    reviews = {}
+    table = read_reviews_table(directory)
+    for chunk in table.to_batches():
+        titles = chunk.column(0)
+        dictionary = titles.dictionary.to_pylist()
+        indices = titles.indices.to_pylist()
+        texts = chunk.column(1).to_pylist()
+        grades = chunk.column(2).to_pylist()
+        for index, review, grade in zip(indices, texts, grades):
+            title = dictionary[index]
+            revs = reviews.get(title)
+            if revs:
+                revs[0][review] = grade
+            else:
+                reviews[title] = [{review: grade}]
+    scores = read_scores_table(directory)
+    num_columns = 5 if sa_scores else 4
+    columns = [scores.column(i).to_pylist() for i in range(num_columns)]
+    for row in zip(*columns):
+        info = reviews.get(row[0])
+        if info:
+            info += row[1:]
+    return reviews
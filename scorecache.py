@@ -0,0 +1,259 @@
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import sentimentanalyzer as sa
+from lexicon import Lexicon
+
+# Changed whenever tokenizing or scoring changes, so older cached scores
+# are never reused.
+SCORER_VERSION = 1
+# The proportion by which the file may exceed max_disk_entries before the
+# oldest sentiments are removed, so removal runs once per many writes.
+DISK_SLACK = 0.1
+# The number of dict lexicons whose compiled Lexicon object is remembered.
+COMPILED_LEXICONS = 4
+
+def review_hash(rev):
+    '''
+        Return a 16 byte content hash of the text of a review. Other objects
+        are converted with str, as tokenize does.
+    '''
+    return hashlib.blake2b(str(rev).encode('utf-8'), digest_size=16).digest()
+
+def lexicon_fingerprint(sentiment_strengths):
+    '''
+        A function which computes a fingerprint identifying the contents of
+        sentiment_strengths, so scores made with one lexicon are never
+        reused for another. A Lexicon object remembers its fingerprint.
+
+        Inputs:
+            sentiment_strengths: A dict object, as described in the
+                sentimentanalyzer.py stratify function, or a Lexicon object
+                compiled from one.
+
+        Returns:
+            A str object containing a hexadecimal digest.
+    '''
+    if isinstance(sentiment_strengths, Lexicon):
+        fingerprint = getattr(sentiment_strengths, 'fingerprint', None)
+        if fingerprint is None:
+            fingerprint = lexicon_fingerprint( \
+                sentiment_strengths.sentiment_strengths)
+            sentiment_strengths.fingerprint = fingerprint
+        return fingerprint
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{SCORER_VERSION}\n'.encode('utf-8'))
+    for gram, score in sorted(sentiment_strengths.items()):
+        digest.update(f'{gram}\t{score}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+class ScoreCache:
+    '''
+        A cache of review sentiments keyed by a content hash of each review
+        and the fingerprint of the lexicon that scored it. Recently used
+        sentiments are held in an in-process LRU of max_entries entries, and
+        if file_name is given every sentiment is also kept in a SQLite file,
+        so later runs skip reviews scored before. The counters hits,
+        disk_hits, and misses record how each lookup was answered. The
+        object may be shared by threads.
+
+        Inputs:
+            max_entries: An int object specifying the number of sentiments
+                held in memory.
+
+            file_name: A str object containing the name of the database
+                file, which is created if it does not exist, or None.
+
+            max_disk_entries: An int object specifying the number of
+                sentiments kept in the file, or None for no limit. The
+                oldest are removed once the file holds DISK_SLACK more than
+                this.
+    '''
+    def __init__(self, max_entries=1000000, file_name=None, \
+                 max_disk_entries=None):
+        self.max_entries = max_entries
+        self.file_name = file_name
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Maps the id of a dict lexicon to it and its compiled Lexicon,
+        # which hold their fingerprint. The dict is kept so its id is not
+        # reused.
+        self._lexicons = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._disk_entries = 0
+        if file_name:
+            self._connection = sqlite3.connect(file_name, \
+                                               check_same_thread=False)
+            with self._lock, self._connection:
+                self._connection.execute(
+                    '''CREATE TABLE IF NOT EXISTS scores (
+                           lexicon TEXT, review BLOB, sentiment INTEGER,
+                           PRIMARY KEY (lexicon, review))''')
+            if max_disk_entries is not None:
+                self._disk_entries = self._count_disk()
+
+    @property
+    def hit_rate(self):
+        '''
+            The proportion of lookups answered from memory or disk.
+        '''
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        '''
+            Return a dict object holding the counters, the hit rate, and the
+            number of sentiments held in memory.
+        '''
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, \
+                'misses': self.misses, 'hit_rate': self.hit_rate, \
+                'entries': len(self._entries)}
+
+    def _remember(self, key, sentiment):
+        self._entries[key] = sentiment
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, fingerprint, hashes):
+        '''
+            Return a dict object mapping those of hashes stored on disk for
+            fingerprint to their sentiments.
+        '''
+        found = {}
+        # Stay under SQLite's limit on the number of query parameters.
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start : start + 500]
+            marks = ', '.join('?' * len(batch))
+            rows = self._connection.execute( \
+                f'''SELECT review, sentiment FROM scores
+                    WHERE lexicon = ? AND review IN ({marks})''', \
+                [fingerprint] + batch).fetchall()
+            found.update(rows)
+        return found
+
+    def _count_disk(self):
+        return self._connection.execute( \
+            'SELECT COUNT(*) FROM scores').fetchone()[0]
+
+    def _write_disk(self, fingerprint, scored):
+        rows = [(fingerprint, key, sentiment) for key, sentiment in scored]
+        with self._connection:
+            self._connection.executemany( \
+                'INSERT OR REPLACE INTO scores VALUES (?, ?, ?)', rows)
+            if self.max_disk_entries is None:
+                return
+            # Counted as if every row were new, and counted exactly only
+            # when removal may be due, so most writes scan nothing.
+            self._disk_entries += len(rows)
+            if self._disk_entries <= self.max_disk_entries * (1 + DISK_SLACK):
+                return
+            self._disk_entries = self._count_disk()
+            if self._disk_entries > self.max_disk_entries:
+                self._connection.execute( \
+                    '''DELETE FROM scores WHERE rowid IN (
+                           SELECT rowid FROM scores ORDER BY rowid DESC
+                           LIMIT -1 OFFSET ?)''', (self.max_disk_entries,))
+                self._disk_entries = self.max_disk_entries
+
+    def _compile(self, sentiment_strengths):
+        '''
+            Return a fingerprinted Lexicon object of sentiment_strengths,
+            compiling a dict object only the first time it is passed.
+        '''
+        if isinstance(sentiment_strengths, Lexicon):
+            return sentiment_strengths
+        key = id(sentiment_strengths)
+        with self._lock:
+            entry = self._lexicons.get(key)
+            if entry is not None and entry[0] is sentiment_strengths:
+                self._lexicons.move_to_end(key)
+                return entry[1]
+        lexicon = Lexicon(sentiment_strengths)
+        lexicon_fingerprint(lexicon)
+        with self._lock:
+            self._lexicons[key] = (sentiment_strengths, lexicon)
+            if len(self._lexicons) > COMPILED_LEXICONS:
+                self._lexicons.popitem(last=False)
+        return lexicon
+
+    def score_many(self, revs, sentiment_strengths):
+        '''
+            A method which computes the sentiment of many reviews as the
+            sentimentanalyzer.py score_many function does, scoring only the
+            reviews which are not cached.
+
+            Inputs:
+                revs, sentiment_strengths: As in the sentimentanalyzer.py
+                    score_many function. A dict object is compiled and
+                    fingerprinted the first time it is passed, and is
+                    remembered by identity, so it must not be modified
+                    afterwards.
+
+            Returns:
+                A numpy array of int64 containing the sentiment of each
+                    review.
+        '''
+        lexicon = self._compile(sentiment_strengths)
+        fingerprint = lexicon_fingerprint(lexicon)
+        revs = list(revs)
+        hashes = [review_hash(rev) for rev in revs]
+        sentiments = np.zeros(len(revs), dtype=np.int64)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(hashes):
+                sentiment = self._entries.get((fingerprint, key))
+                if sentiment is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._entries.move_to_end((fingerprint, key))
+                    sentiments[i] = sentiment
+                    self.hits += 1
+            if missing and self._connection:
+                for key, sentiment in self._read_disk(fingerprint, \
+                                                      list(missing)).items():
+                    for i in missing.pop(key):
+                        sentiments[i] = sentiment
+                        self.disk_hits += 1
+                    self._remember((fingerprint, key), sentiment)
+        if not missing:
+            return sentiments
+        # Reviews repeated within revs are scored once.
+        keys = list(missing)
+        new = sa.score_many([revs[missing[key][0]] for key in keys], \
+                            lexicon).tolist()
+        with self._lock:
+            for key, sentiment in zip(keys, new):
+                for i in missing[key]:
+                    sentiments[i] = sentiment
+                    self.misses += 1
+                self._remember((fingerprint, key), sentiment)
+            if self._connection:
+                self._write_disk(fingerprint, zip(keys, new))
+        return sentiments
+
+    def clear(self):
+        '''
+            Empty the in-memory cache and reset the counters. Sentiments on
+            disk are kept.
+        '''
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def close(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,6 +1,9 @@
+import os
 import pandas as pd
+import dataprep
+from titleindex import TitleIndex
 
-def make_train_test(reviews_text_csv):
+def make_train_test(reviews_text_csv, seed=0, method='random', cache_dir=None):
     '''
         A function to produce training and test DataFrames from a csv
         containing movie reviews.
@@ -10,21 +13,23 @@ def make_train_test(reviews_text_csv):
                 csv file with one column containing the title of a movie,
                 one column containing the text of a review,
                 and one column containing a boolean indicating whether the
-                review was positive (True) or negative (False).
+                review was positive (True) or negative (False). The name of
+                a directory written by the reviewstore.py
+                write_reviews_store function may be given instead.
+
+            seed, method, cache_dir: As in the dataprep.py make_train_test
+                function. By default, 40% of the rows are sampled for
+                training as they always have been.
         
         Returns:
             df_train, df_test: Training and test sets from the csv file.
                 Both objects are pandas DataFrame objects with columns as
                 in the csv file.
     '''
-    df = pd.read_csv(reviews_text_csv)
-    df_train = df.sample(frac=0.4, random_state=0)
-    df_test = df.drop(df_train.index)
-    df_train.index = range(0, len(df_train))
-    df_test.index = range(0, len(df_test))
-    return df_train, df_test
+    return dataprep.make_train_test(reviews_text_csv, 0.4, seed, method, \
+                                    cache_dir)
 
-def get_merged_df(rotten_tomatoes_scores_csv, imdb_scores_csv):
+def get_merged_df(rotten_tomatoes_scores_csv, imdb_scores_csv, fuzzy=False):
     '''
         A function to produce one DataFrame containing scores for a movie
         from Rotten Tomatoes and IMDb.
@@ -33,19 +38,42 @@ def get_merged_df(rotten_tomatoes_scores_csv, imdb_scores_csv):
             rotten_tomatoes_scores_csv: A string containing the name of a csv
                 file with a column for the title, audience score, tomatometer
                 score, rating (rotten, fresh, or certified-fresh), and
-                sentiment analyzer score.
+                sentiment analyzer score, or the name of a directory written
+                by the reviewstore.py write_reviews_store function.
             
             imdb_scores_csv: A string containing the name of a csv file with
                 a column for the title and a column for the IMDb score.
+
+            fuzzy: A boolean. If True, each Rotten Tomatoes title is joined
+                to the IMDb title found by the titleindex.py TitleIndex match
+                method, so differences in punctuation, years, articles and
+                spelling do not drop rows. The Rotten Tomatoes title is
+                kept. Otherwise titles must be identical.
         
         Returns:
             A pandas DataFrame object with all of the columns of the csv files
                 described above.
     '''
-    df_rotten_tomatoes = pd.read_csv(rotten_tomatoes_scores_csv)
+    if os.path.isdir(rotten_tomatoes_scores_csv):
+        import reviewstore
+        df_rotten_tomatoes = reviewstore.read_scores_df( \
+            rotten_tomatoes_scores_csv)
+    else:
+        df_rotten_tomatoes = pd.read_csv(rotten_tomatoes_scores_csv)
     df_imdb = pd.read_csv(imdb_scores_csv)
-    merged_df = pd.merge(df_rotten_tomatoes, df_imdb, on='Title', how='inner')
-    return merged_df
+    if not fuzzy:
+        return pd.merge(df_rotten_tomatoes, df_imdb, on='Title', how='inner')
+    # Rows without a title, and titles without a match, are dropped before
+    # merging, since pandas joins missing keys to each other.
+    df_imdb = df_imdb.dropna(subset=['Title'])
+    index = TitleIndex(df_imdb['Title'])
+    imdb_titles = [index.match(title) for title in df_rotten_tomatoes['Title']]
+    df_rotten_tomatoes = df_rotten_tomatoes.assign(**{'IMDb Title': imdb_titles})
+    df_rotten_tomatoes = df_rotten_tomatoes.dropna(subset=['IMDb Title'])
+    df_imdb = df_imdb.rename(columns={'Title': 'IMDb Title'})
+    merged_df = pd.merge(df_rotten_tomatoes, df_imdb, on='IMDb Title', \
+                         how='inner')
+    return merged_df.drop(columns='IMDb Title')
 
 def normalize_imdb_score(score):
     '''
@@ -0,0 +1,255 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import sentimentanalyzer as sa
+import sentiment_analyzer_builder as sab
+import review_scraper_driver as rsd
+import rescoring
+from tokenizer import Tokenizer
+from lexicon import Lexicon
+
+# Number of reviews whose tokens the server remembers. Clients often send
+# the same reviews again, and rescoring a movie tokenizes all of its
+# stored reviews each time.
+TOKENIZE_CACHE_SIZE = 65536
+
+class LatencyRecorder:
+    '''
+        A thread-safe record of the most recent request latencies of each
+        endpoint, from which percentiles are reported.
+
+        Inputs:
+            window: An int object specifying the number of recent requests
+                kept per endpoint.
+    '''
+    def __init__(self, window=10000):
+        self.window = window
+        self._latencies = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque(maxlen=self.window)
+            latencies.append(seconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+    def stats(self):
+        '''
+            Return a dict object mapping each endpoint to its request count
+            and its p50 and p99 latency in milliseconds.
+        '''
+        with self._lock:
+            samples = {endpoint: sorted(latencies) \
+                       for endpoint, latencies in self._latencies.items()}
+            counts = dict(self._counts)
+        stats = {}
+        for endpoint, latencies in samples.items():
+            stats[endpoint] = {'count': counts[endpoint], \
+                               'p50_ms': percentile(latencies, 50) * 1000, \
+                               'p99_ms': percentile(latencies, 99) * 1000}
+        return stats
+
+def percentile(sorted_values, p):
+    '''
+        Return the pth percentile of a sorted list by the nearest rank.
+    '''
+    rank = min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))
+    return sorted_values[rank]
+
+class ScoringService:
+    '''
+        The state of a scoring server: a compiled lexicon, the tokenizer,
+        and optionally the stored reviews of movies, all loaded once when
+        the service starts and reused by every request.
+
+        Inputs:
+            sentiment_strengths: A dict object, as described in the
+                sentimentanalyzer.py stratify function, or a Lexicon object
+                compiled from one.
+
+            reviews: A dict object as described in the
+                review_scraper_driver.py read_movie_page function, or None
+                if movies are not rescored by title.
+
+            cache_size: An int object specifying the number of reviews
+                whose tokens are cached, as in the tokenizer.py Tokenizer
+                class.
+    '''
+    def __init__(self, sentiment_strengths, reviews=None, \
+                 cache_size=TOKENIZE_CACHE_SIZE):
+        if not isinstance(sentiment_strengths, Lexicon):
+            sentiment_strengths = Lexicon(sentiment_strengths)
+        self.lexicon = sentiment_strengths
+        self.reviews = reviews or {}
+        self.latency = LatencyRecorder()
+        # The tokenizer is shared by every request thread, and is loaded
+        # before the first one.
+        self.tokenizer = Tokenizer(sa.NAMES, sa.STOPWORDS, sa.PUNCTUATION, \
+                                   cache_size)
+
+    def score(self, revs):
+        '''
+            Return a dict object holding the sentiment and normalized score
+            of each review in revs, a list of str objects.
+        '''
+        raw_scores = sa.score_many(revs, self.lexicon, \
+                                   tokenizer=self.tokenizer)
+        return {'sentiments': raw_scores.tolist(), \
+                'scores': sa.normalize_many(raw_scores).tolist()}
+
+    def rescore(self, title):
+        '''
+            Return a dict object holding the stored scores of a movie and its
+            sentiment analyzer score, as add_sentiment_scores computes it, or
+            None if the movie is not stored.
+        '''
+        info = self.reviews.get(title)
+        if info is None:
+            return None
+        _, sa_score = next(rescoring.score_movies([(title, info[0])], \
+                                                  self.lexicon, \
+                                                  tokenizer=self.tokenizer))
+        scores = info[1:4] + [None] * (4 - len(info))
+        return {'title': title, 'audience_score': scores[0], \
+                'tomatometer_score': scores[1], 'rating': scores[2], \
+                'num_reviews': len(info[0]), \
+                'sa_score': None if sa_score is None else float(sa_score)}
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    '''
+        Handles the requests of a scoring server:
+
+            POST /score with a json object {"reviews": [text, ...]} returns
+                {"sentiments": [...], "scores": [...]}.
+
+            GET /movie?title=... returns the stored scores of a movie and
+                its sentiment analyzer score.
+
+            GET /stats returns the count and p50 and p99 latency of the
+                requests to each endpoint.
+    '''
+    service = None
+
+    def log_message(self, format, *args):
+        # Logging every request would dominate the latency measured.
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _timed(self, endpoint, handle):
+        start = time.perf_counter()
+        try:
+            status, body = handle()
+        except (ValueError, KeyError, TypeError) as e:
+            status, body = 400, {'error': str(e)}
+        self._send(status, body)
+        self.service.latency.record(endpoint, time.perf_counter() - start)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path != '/score':
+            self._send(404, {'error': f'No endpoint {path}.'})
+            return
+
+        def handle():
+            length = int(self.headers.get('Content-Length', 0))
+            revs = json.loads(self.rfile.read(length))['reviews']
+            if not isinstance(revs, list) or \
+               not all(isinstance(rev, str) for rev in revs):
+                raise ValueError('reviews must be a list of strings.')
+            return 200, self.service.score(revs)
+        self._timed('/score', handle)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/stats':
+            self._send(200, self.service.latency.stats())
+        elif url.path == '/movie':
+            def handle():
+                title = parse_qs(url.query)['title'][0]
+                movie = self.service.rescore(title)
+                if movie is None:
+                    return 404, {'error': f'No movie titled {title}.'}
+                return 200, movie
+            self._timed('/movie', handle)
+        else:
+            self._send(404, {'error': f'No endpoint {url.path}.'})
+
+def serve(service, host='127.0.0.1', port=8000):
+    '''
+        A function which starts a scoring server in a background thread.
+
+        Inputs:
+            service: A ScoringService object.
+
+            host, port: The address to listen on. Port 0 picks a free port.
+
+        Returns:
+            A tuple of the ThreadingHTTPServer object, which should be shut
+                down with its shutdown method, and a str object containing
+                the base url of the server.
+    '''
+    handler = type('Handler', (ScoringHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}/'
+
+def load_service(lexicon_file, scores_csv=None, reviews_csv=None):
+    '''
+        A function which builds a ScoringService from stored files.
+
+        Inputs:
+            lexicon_file: A str object containing the name of a csv file
+                made by the sentiment_analyzer_builder.py
+                gen_csv_from_sentiment_strengths function, or of a binary
+                lexicon made by gen_lexicon_from_sentiment_strengths.
+
+            scores_csv, reviews_csv: str objects as described in the
+                review_scraper_driver.py gen_revs_from_csvs function, or None
+                if movies are not rescored by title.
+
+        Returns:
+            A ScoringService object.
+    '''
+    if lexicon_file.endswith('.csv'):
+        sentiment_strengths = sab.gen_sentiment_strengths_from_csv(lexicon_file)
+    else:
+        sentiment_strengths = sab.gen_sentiment_strengths_from_lexicon( \
+            lexicon_file)
+    reviews = None
+    if scores_csv and reviews_csv:
+        reviews = rsd.gen_revs_from_csvs(scores_csv, reviews_csv, False)
+    return ScoringService(sentiment_strengths, reviews)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve sentiment scores.')
+    parser.add_argument('lexicon_file')
+    parser.add_argument('--scores-csv')
+    parser.add_argument('--reviews-csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    service = load_service(args.lexicon_file, args.scores_csv, \
+                           args.reviews_csv)
+    server, url = serve(service, args.host, args.port)
+    print(f'Serving on {url}', file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
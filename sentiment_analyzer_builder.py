@@ -1,5 +1,9 @@
 import sentimentanalyzer as sa
+import os
 import csv
+import pandas as pd
+import vocabulary
+from lexicon import write_lexicon, BinaryLexicon
 
 def build_sentiment_strengths(df_train):
     '''
@@ -18,11 +22,22 @@ def build_sentiment_strengths(df_train):
             those ngrams, as described in the sentimentanalyzer.py
             stratify function.
     '''
+    # Ngrams are counted and ranked as int keys of a shared vocabulary, and
+    # only those given a strength are converted back to strings.
     sentiment_strengths = {}
     revs = sa.get_revs(df_train)
-    pos_revs_dist, neg_revs_dist = sa.create_big_dist(revs)
-    most_common_pos, most_common_neg = sa.find_tops(pos_revs_dist, neg_revs_dist)
-    sa.stratify(most_common_pos, most_common_neg, sentiment_strengths)
+    try:
+        pos_dist, neg_dist = vocabulary.create_big_dist(revs)
+    except vocabulary.VocabularyFull:
+        # Too many distinct words for int keys, so ngram strings are
+        # counted instead, which is slower but has no limit.
+        pos_revs_dist, neg_revs_dist = sa.create_big_dist(revs)
+        most_common_pos, most_common_neg = sa.find_tops(pos_revs_dist, \
+                                                        neg_revs_dist)
+        sa.stratify(most_common_pos, most_common_neg, sentiment_strengths)
+        return sentiment_strengths
+    top_pos, top_neg = vocabulary.find_tops(pos_dist, neg_dist)
+    vocabulary.stratify(pos_dist.vocab, top_pos, top_neg, sentiment_strengths)
     return sentiment_strengths
 
 def build_sentiment_strengths_123grams(df_train):
@@ -42,25 +57,84 @@ def build_sentiment_strengths_123grams(df_train):
     '''
     sentiment_strengths = {}
     revs = sa.get_revs(df_train)
-    one_pos_dist = {}
-    one_neg_dist = {}
-    two_pos_dist = {}
-    two_neg_dist = {}
-    three_pos_dist = {}
-    three_neg_dist = {}
-    sa.create_distributions(revs, 1, one_pos_dist, one_neg_dist)
-    sa.create_distributions(revs, 1, two_pos_dist, two_neg_dist)
-    sa.create_distributions(revs, 1, three_pos_dist, three_neg_dist)
-    one_pos_common, one_neg_common = sa.find_tops(one_pos_dist, \
-                                                 one_neg_dist, alpha=sa.ALPHA_1)
-    two_pos_common, two_neg_common = sa.find_tops(two_pos_dist, \
-                                                 two_neg_dist, alpha=sa.ALPHA_2)
-    three_pos_common, three_neg_common = sa.find_tops(three_pos_dist, \
-                                                   three_neg_dist, \
-                                                   alpha=sa.ALPHA_3)
-    sa.stratify(one_pos_common, one_neg_common, sentiment_strengths)
-    sa.stratify(two_pos_common, two_neg_common, sentiment_strengths)
-    sa.stratify(three_pos_common, three_neg_common, sentiment_strengths)
+    alphas = [(1, sa.ALPHA_1), (2, sa.ALPHA_2), (3, sa.ALPHA_3)]
+    try:
+        pos_dist, neg_dist = vocabulary.create_big_dist(revs)
+    except vocabulary.VocabularyFull:
+        # As in build_sentiment_strengths.
+        for n, alpha in alphas:
+            pos_revs_dist = {}
+            neg_revs_dist = {}
+            sa.create_distributions(revs, n, pos_revs_dist, neg_revs_dist)
+            most_common_pos, most_common_neg = sa.find_tops( \
+                pos_revs_dist, neg_revs_dist, alpha)
+            sa.stratify(most_common_pos, most_common_neg, sentiment_strengths)
+        return sentiment_strengths
+    for n, alpha in alphas:
+        top_pos, top_neg = vocabulary.find_tops(pos_dist.restrict(n), \
+                                                neg_dist.restrict(n), alpha)
+        vocabulary.stratify(pos_dist.vocab, top_pos, top_neg, \
+                            sentiment_strengths)
+    return sentiment_strengths
+
+def read_review_chunks(file_name, chunksize=100000):
+    '''
+        A generator which reads training data in chunks, so that it never
+        needs to fit in memory at once.
+
+        Inputs:
+            file_name: A str object containing the name of a csv file made by
+                the review_scraper_driver.py gen_csv_reviews_text function, or
+                of a directory made by the reviewstore.py write_reviews_store
+                function.
+
+            chunksize: An int object specifying the most rows in a chunk.
+
+        Returns:
+            Yields pandas DataFrame objects with the columns described in
+                build_sentiment_strengths.
+    '''
+    if os.path.isdir(file_name):
+        import reviewstore
+        yield from reviewstore.iter_reviews_dfs(file_name, chunksize)
+    else:
+        yield from pd.read_csv(file_name, chunksize=chunksize)
+
+def build_sentiment_strengths_from_chunks(chunks, alpha=sa.ALPHA, \
+                                          memory_budget=2 ** 28, \
+                                          spill_dir=None):
+    '''
+        A function which builds the sentiment strengths dict object as
+        build_sentiment_strengths does, but from training data read in
+        chunks. Ngram counts are merged as chunks arrive and spilled to disk
+        past memory_budget, so corpora larger than memory can be used.
+
+        Inputs:
+            chunks: An iterable of pandas DataFrame objects like df_train in
+                build_sentiment_strengths, such as read_review_chunks
+                returns.
+
+            alpha: As in the sentimentanalyzer.py find_tops function.
+
+            memory_budget, spill_dir: As in the vocabulary.py
+                create_big_dist_from_chunks function.
+
+        Returns:
+            sentiment_strengths, as in build_sentiment_strengths. It is the
+                same dict object build_sentiment_strengths returns for the
+                chunks joined into one DataFrame, except where a review is
+                repeated with different labels: build_sentiment_strengths
+                counts it with its last label, as the sentimentanalyzer.py
+                get_revs function does, while this function counts it with
+                its first, since later chunks have not been read. Unlike
+                build_sentiment_strengths, a corpus with more words than a
+                vocabulary.py Vocabulary holds raises VocabularyFull.
+    '''
+    sentiment_strengths = {}
+    pos_dist, neg_dist = vocabulary.create_big_dist_from_chunks( \
+        chunks, memory_budget=memory_budget, spill_dir=spill_dir)
+    top_pos, top_neg = vocabulary.find_tops(pos_dist, neg_dist, alpha)
+    vocabulary.stratify(pos_dist.vocab, top_pos, top_neg, sentiment_strengths)
     return sentiment_strengths
 
 def gen_csv_from_sentiment_strengths(sentiment_strengths, file_name):
@@ -101,4 +175,52 @@ def gen_sentiment_strengths_from_csv(csvfile):
         reader = csv.reader(f)
         for line in reader:
             sentiment_strengths[str(line[0])] = int(line[1])
-    return sentiment_strengths
\ No newline at end of file
+    return sentiment_strengths
+
+def gen_lexicon_from_sentiment_strengths(sentiment_strengths, file_name):
+    '''
+        Generate a binary lexicon file from sentiment_strengths, which is
+        smaller and much faster to reload than a csv file.
+
+        Inputs:
+            sentiment_strengths: A dict object, as in
+                build_sentiment_strengths.
+
+            file_name: A string object containing the name of the
+                lexicon file to be generated.
+
+        Returns:
+            Nothing is returned, but a lexicon file in the format described
+                in the lexicon.py write_lexicon function is generated.
+    '''
+    write_lexicon(sentiment_strengths, file_name)
+
+def gen_sentiment_strengths_from_lexicon(lexicon_file):
+    '''
+        Load sentiment_strengths from a binary lexicon file. The file is
+        memory mapped rather than parsed.
+
+        Inputs:
+            lexicon_file: A string containing the name of a lexicon file
+                generated by gen_lexicon_from_sentiment_strengths.
+
+        Returns:
+            A BinaryLexicon object, which can be read like the
+                sentiment_strengths dict object in build_sentiment_strengths.
+    '''
+    return BinaryLexicon(lexicon_file)
+
+def gen_lexicon_from_csv(csvfile, file_name):
+    '''
+        Convert a csv file generated by gen_csv_from_sentiment_strengths into
+        a binary lexicon file.
+    '''
+    write_lexicon(gen_sentiment_strengths_from_csv(csvfile), file_name)
+
+def gen_csv_from_lexicon(lexicon_file, file_name):
+    '''
+        Convert a binary lexicon file into a csv file, as generated by
+        gen_csv_from_sentiment_strengths.
+    '''
+    with BinaryLexicon(lexicon_file) as sentiment_strengths:
+        gen_csv_from_sentiment_strengths(sentiment_strengths, file_name)
@@ -1,19 +1,95 @@
-import nltk
+import os
 import string
 import math
+import heapq
+import multiprocessing
+from collections import Counter
+import numpy as np
 import trainer
+from tokenizer import Tokenizer
+from lexicon import Lexicon, NgramTrie
 
 # https://github.com/nltk/nltk/blob/develop/nltk/sentiment/vader.py#L441
 
 PUNCTUATION = string.punctuation
-nltk.download(['names', 'stopwords'])
-NAMES = nltk.corpus.names.words()
-STOPWORDS = nltk.corpus.stopwords.words('english')
-STOPWORDS.append("n't")
+# NAMES, STOPWORDS, and TOKENIZER are loaded on first use (see __getattr__),
+# so importing this module does not import nltk or touch the network.
+# The NLTK corpora are looked for, and downloaded to, NLTK_DATA_DIR.
+# With OFFLINE set, missing corpora raise a LookupError instead.
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA', \
+                    os.path.join(os.path.expanduser('~'), 'nltk_data')) \
+                  .split(os.pathsep)[0]
+OFFLINE = os.environ.get('SA_OFFLINE', '0') not in ('', '0')
 ALPHA = 0.215
 ALPHA_1 = 0.784
 ALPHA_2 = 0.178
 ALPHA_3 = 0.175
+# Number of reviews whose tokens are remembered between calls to tokenize.
+# Training and scoring tokenize each review once, so none are by default.
+TOKENIZE_CACHE_SIZE = 0
+_RESOURCES = {}
+
+def load_corpus(name):
+    '''
+        A function which finds an NLTK corpus, downloading it to
+        NLTK_DATA_DIR only if it is missing and OFFLINE is not set.
+
+        Inputs:
+            name: A str object containing the name of the corpus.
+
+        Returns:
+            The nltk.corpus reader for the corpus.
+    '''
+    import nltk
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    try:
+        nltk.data.find('corpora/' + name)
+    except LookupError:
+        if OFFLINE:
+            raise LookupError((f"The NLTK corpus '{name}' is not in "
+                               f"{NLTK_DATA_DIR} and OFFLINE is set."))
+        nltk.download(name, download_dir=NLTK_DATA_DIR, quiet=True)
+    return getattr(nltk.corpus, name)
+
+def get_names():
+    '''
+        Return the list of names removed by tokenize, loading it once.
+    '''
+    if 'names' not in _RESOURCES:
+        _RESOURCES['names'] = load_corpus('names').words()
+    return _RESOURCES['names']
+
+def get_stopwords():
+    '''
+        Return the list of stopwords removed by tokenize, loading it once.
+    '''
+    if 'stopwords' not in _RESOURCES:
+        stopwords = load_corpus('stopwords').words('english')
+        stopwords.append("n't")
+        _RESOURCES['stopwords'] = stopwords
+    return _RESOURCES['stopwords']
+
+def get_tokenizer():
+    '''
+        Return the Tokenizer object used by tokenize, building it once.
+    '''
+    if 'tokenizer' not in _RESOURCES:
+        _RESOURCES['tokenizer'] = Tokenizer(get_names(), get_stopwords(), \
+                                            PUNCTUATION, TOKENIZE_CACHE_SIZE)
+    return _RESOURCES['tokenizer']
+
+def __getattr__(name):
+    '''
+        Load NAMES, STOPWORDS, and TOKENIZER when they are first accessed.
+    '''
+    if name == 'NAMES':
+        return get_names()
+    if name == 'STOPWORDS':
+        return get_stopwords()
+    if name == 'TOKENIZER':
+        return get_tokenizer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_revs(df_train):
     '''
@@ -31,18 +107,18 @@ def get_revs(df_train):
             indicating whether they are positive (True) or negative (False).
     
     '''
-    revs = {}
-    for i in range(len(df_train)):
-        rev = df_train['Review'][i]
-        is_pos = df_train['Review is Positive'][i]
-        revs[rev] = is_pos
-    return revs
+    # Whole columns are read at once. A review repeated with different
+    # labels keeps its last label; dataprep.py counts such reviews.
+    return dict(zip(df_train['Review'].tolist(), \
+                    df_train['Review is Positive'].to_numpy()))
 
 def tokenize(rev):
     '''
         A function to convert the text of a review into a list of words.
         We remove names, punctuation, common words that do not carry sentiment
         and will clutter our analysis, and we force words to be lower case.
+        The work is done by the module's Tokenizer object, which
+        remembers the cleaned form of recently seen words.
 
         Inputs:
             rev: A str object containing the text of a review.
@@ -50,21 +126,7 @@ def tokenize(rev):
         Returns:
             A list object containing the words in the review.
     '''
-    potential_tokens = str(rev).split()
-    tokens = []
-    for token in potential_tokens:
-        # Remove stopwords and names
-        if token in NAMES:
-            continue
-        token = token.lower()
-        token = token.strip(PUNCTUATION)
-        if token in STOPWORDS:
-            continue
-        # Remove singletons and empty strings (after stripping)
-        if len(token) <= 1:
-            continue
-        tokens.append(token)
-    return tokens
+    return get_tokenizer().tokenize(rev)
 
 def create_distributions(revs, n, pos_revs_dist, neg_revs_dist):
     '''
@@ -98,23 +160,88 @@ def create_distributions(revs, n, pos_revs_dist, neg_revs_dist):
                 token_ct += 1
                 neg_revs_dist[token] = token_ct
 
-def create_big_dist(revs):
+def ngrams(tokens, n):
+    '''
+        A function which joins consecutive tokens into ngrams.
+
+        Inputs:
+            tokens: A list object as returned by tokenize.
+
+            n: An int object indicating what length ngrams we want.
+
+        Returns:
+            An iterable of str objects containing the ngrams of tokens,
+                in the order they appear.
+    '''
+    if n == 1:
+        return tokens
+    return map(' '.join, zip(*(tokens[i:] for i in range(n))))
+
+def count_ngrams(rev_items, ns=(1, 2, 3)):
+    '''
+        A function which counts the ngrams of several lengths in a single
+        pass over the reviews, tokenizing each review once.
+
+        Inputs:
+            rev_items: An iterable of (review, is_pos) tuples, such as the
+                items of the dict object described in get_revs.
+
+            ns: A tuple of int objects containing the ngram lengths to count.
+
+        Returns:
+            A tuple of two list objects. Each contains one Counter object per
+                entry of ns, mapping ngrams of that length to the number of
+                their occurrences in positive (negative) reviews.
+    '''
+    pos_counts = [Counter() for _ in ns]
+    neg_counts = [Counter() for _ in ns]
+    for rev, is_pos in rev_items:
+        tokens = tokenize(rev)
+        counts = pos_counts if is_pos else neg_counts
+        for count, n in zip(counts, ns):
+            count.update(ngrams(tokens, n))
+    return pos_counts, neg_counts
+
+def create_big_dist(revs, processes=1):
     '''
         A function which maps ngrams to the number of times
         they appear in positive and negative reviews.
-        We consider ngrams for n = 1, 2, and 3.
+        We consider ngrams for n = 1, 2, and 3, counting all three in one
+        pass over the reviews. The reviews may be split into contiguous
+        shards counted by a pool of worker processes.
+        The result, including the order of ngrams with equal counts, is the
+        same as calling create_distributions for n = 1, 2, and 3 in turn.
 
         Inputs:
             revs: A dict object as described in get_revs.
+
+            processes: An int object specifying the number of worker
+                processes to use. With 1, the work is done in this process.
         
         Returns:
             A tuple containing the pos_revs_dist and neg_revs_dist
-                dict objects, as described in create_distributions.
+                Counter objects, as described in create_distributions.
     '''
-    pos_revs_dist = {}
-    neg_revs_dist = {}
-    for i in range(1,4):
-        create_distributions(revs, i, pos_revs_dist, neg_revs_dist)
+    ns = (1, 2, 3)
+    rev_items = list(revs.items())
+    if processes > 1 and len(rev_items) > processes:
+        # Load the tokenizer before forking so the workers share it.
+        get_tokenizer()
+        size = math.ceil(len(rev_items) / processes)
+        shards = [rev_items[i : i + size] \
+                  for i in range(0, len(rev_items), size)]
+        with multiprocessing.Pool(processes) as pool:
+            partials = pool.map(count_ngrams, shards)
+    else:
+        partials = [count_ngrams(rev_items, ns)]
+    pos_revs_dist = Counter()
+    neg_revs_dist = Counter()
+    # Merge ngram lengths in order, and shards in order within each length,
+    # so ngrams are inserted in the order create_distributions would use.
+    for i in range(len(ns)):
+        for pos_counts, neg_counts in partials:
+            pos_revs_dist.update(pos_counts[i])
+            neg_revs_dist.update(neg_counts[i])
     return pos_revs_dist, neg_revs_dist
 
 def find_tops(pos_revs_dist, neg_revs_dist, alpha=ALPHA):
@@ -139,29 +266,35 @@ def find_tops(pos_revs_dist, neg_revs_dist, alpha=ALPHA):
                 Common words are removed. The lists are sorted from most 
                 frequently occurring to least.
     '''
-    pos_revs_sorted = sorted(pos_revs_dist.items(), \
-                            key=lambda x: x[1], reverse=True)
-    neg_revs_sorted = sorted(neg_revs_dist.items(), \
-                            key=lambda x: x[1], reverse=True)
-    k = round(alpha * min(len(pos_revs_sorted), len(neg_revs_sorted)))
-    most_common_pos = pos_revs_sorted[0: k]
-    most_common_neg = neg_revs_sorted[0: k]
-    # Use while loop to remove items
-    i = 0
-    while i < k:
-        j = 0
-        pos_item = most_common_pos[i]
-        while j < k:
-            neg_item = most_common_neg[j]
-            if pos_item[0] == neg_item[0]:
-                most_common_pos.remove(pos_item)
-                most_common_neg.remove(neg_item)
-                k -= 1
-                i -= 1
-                break
-            j += 1
-        i += 1
-    return most_common_pos, most_common_neg
+    k = round(alpha * min(len(pos_revs_dist), len(neg_revs_dist)))
+    # nlargest breaks ties by insertion order, exactly as the stable sort
+    # of every item followed by slicing would.
+    most_common_pos = heapq.nlargest(k, pos_revs_dist.items(), \
+                                     key=lambda x: x[1])
+    most_common_neg = heapq.nlargest(k, neg_revs_dist.items(), \
+                                     key=lambda x: x[1])
+    return remove_shared(most_common_pos, most_common_neg)
+
+def remove_shared(most_common_pos, most_common_neg):
+    '''
+        A function which removes the ngrams appearing in both lists of
+        frequently occurring ngrams. Both lists lose the same number of
+        items, so they remain the same length, and nothing is added to
+        replace the removed ngrams.
+
+        Inputs:
+            most_common_pos, most_common_neg: list objects of tuples of
+                ngrams and their number of occurrences, with the same length.
+
+        Returns:
+            Two new list objects, as described in find_tops.
+    '''
+    shared = {gram for gram, _ in most_common_pos}
+    shared.intersection_update(gram for gram, _ in most_common_neg)
+    if not shared:
+        return list(most_common_pos), list(most_common_neg)
+    return [item for item in most_common_pos if item[0] not in shared], \
+           [item for item in most_common_neg if item[0] not in shared]
 
 def stratify(most_common_pos, most_common_neg, sentiment_strengths):
     '''
@@ -201,11 +334,15 @@ def get_sentiment(rev, sentiment_strengths):
             rev: A str object containing the text of a review.
 
             sentiment_strengths: A dict object, as described in the
-                stratify function.
+                stratify function. An NgramTrie object compiled from one may
+                be passed instead, in which case only the ngrams of the
+                review found in the trie are visited.
         
         Returns:
             An int object representing the sentiment contained in a review.
     '''
+    if isinstance(sentiment_strengths, NgramTrie):
+        return sentiment_strengths.score(tokenize(rev))
     sentiment = 0
     rev = tokenize(rev)
     num_words = len(rev)
@@ -218,7 +355,7 @@ def get_sentiment(rev, sentiment_strengths):
                 sentiment += sentiment_strengths.get(token, 0)
     return sentiment
 
-def test(df_test, sentiment_strengths):
+def test(df_test, sentiment_strengths, cache=None):
     '''
         A function which tests sentiment_strengths' ability to classify
         new reviews as positive or negative. If the reviews' sentiment is
@@ -233,26 +370,53 @@ def test(df_test, sentiment_strengths):
             
             sentiment_strengths: dict object as described in the
                 stratify function.
+
+            cache: A scorecache.py ScoreCache object, or None.
         
         Returns: The proportion of the reviews that were classified correctly,
             of the reviews that were able to be classified.
     '''
-    correct = 0
-    total = 0
-    for i in range(len(df_test)):
-        rev = tokenize(str(df_test['Review'][i]))
-        sentiment = get_sentiment(rev, sentiment_strengths)
-        if sentiment == 0:
-            continue
-        if sentiment > 0:
-            is_pos = True
-        else:
-            is_pos = False
-        if is_pos == df_test['Review is Positive'][i]:
-            correct += 1
-        total += 1
+    # As before, reviews are tokenized here and again by the scorer.
+    revs = [tokenize(str(rev)) for rev in df_test['Review']]
+    sentiments = score_many(revs, sentiment_strengths, cache)
+    classified = sentiments != 0
+    labels = np.array([is_pos == True \
+                       for is_pos in df_test['Review is Positive']], dtype=bool)
+    correct = int(np.sum((sentiments > 0)[classified] == labels[classified]))
+    total = int(np.sum(classified))
     return correct / total
 
+def score_many(revs, sentiment_strengths, cache=None, tokenizer=None):
+    '''
+        A function which computes the sentiment strength of many reviews at
+        once, with the same result as calling get_sentiment on each.
+
+        Inputs:
+            revs: A list object or pandas Series containing the text of
+                reviews.
+
+            sentiment_strengths: A dict object, as described in the
+                stratify function, or a Lexicon object compiled from one.
+                Compiling takes time, so pass a Lexicon object when scoring
+                several batches with the same sentiment_strengths.
+
+            cache: A scorecache.py ScoreCache object, or None. Reviews it
+                holds a sentiment for are not scored again.
+
+            tokenizer: A tokenizer.py Tokenizer object used in place of
+                tokenize, such as one caching reviews, or None.
+
+        Returns:
+            A numpy array of int64 containing the sentiment of each review.
+    '''
+    if cache is not None:
+        return cache.score_many(revs, sentiment_strengths)
+    if not isinstance(sentiment_strengths, Lexicon):
+        sentiment_strengths = Lexicon(sentiment_strengths)
+    tokenize_rev = tokenize if tokenizer is None else tokenizer.tokenize
+    return sentiment_strengths.score_tokens([tokenize_rev(rev) \
+                                             for rev in revs])
+
 def normalize_score(sentiment):
     '''
         A function to normalize a sentiment score to be between 0 and 100.
@@ -268,3 +432,19 @@ def normalize_score(sentiment):
     sentiment = sentiment / math.sqrt((sentiment ** 2) + 15)
     sentiment = (sentiment + 1) * 50
     return sentiment
+
+def normalize_many(sentiments):
+    '''
+        A function to normalize many sentiment scores to be between 0 and
+        100, as normalize_score does.
+
+        Inputs:
+            sentiments: A numpy array or list object of sentiment scores,
+                as returned by score_many.
+
+        Returns:
+            A numpy array of float64 containing the normalized scores.
+    '''
+    sentiments = np.asarray(sentiments, dtype=np.float64)
+    sentiments = sentiments / np.sqrt((sentiments ** 2) + 15)
+    return (sentiments + 1) * 50
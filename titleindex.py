@@ -0,0 +1,136 @@
+import re
+import unicodedata
+import numpy as np
+
+# Leading articles dropped when normalizing, and the same articles moved to
+# the end of a title, as in 'Godfather, The'.
+ARTICLES = ('the', 'a', 'an')
+YEAR = re.compile(r'\s*[\(\[]\s*(1[89]|20)\d\d\s*[\)\]]\s*$')
+TRAILING_ARTICLE = re.compile(r',\s*(the|a|an)\s*$')
+NOT_WORD = re.compile(r'[^0-9a-z]+')
+NUMBER = re.compile(r'\d+')
+
+def normalize_title(title):
+    '''
+        A function which reduces a movie title to a form in which the
+        spellings used by Rotten Tomatoes and IMDb agree. Accents, case,
+        punctuation, a trailing year such as ' (2021)', and a leading or
+        trailing article are removed, and '&' is read as 'and'.
+
+        Inputs:
+            title: A str object containing a movie title.
+
+        Returns:
+            A str object containing the normalized title, with words
+                separated by single spaces.
+    '''
+    title = unicodedata.normalize('NFKD', str(title))
+    title = ''.join(c for c in title if not unicodedata.combining(c))
+    title = YEAR.sub('', title.lower())
+    title = TRAILING_ARTICLE.sub('', title)
+    words = NOT_WORD.sub(' ', title.replace('&', ' and ')).split()
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    return ' '.join(words)
+
+def trigrams(normalized):
+    '''
+        Return the set of character trigrams of a normalized title, padded
+        so that the first and last letters start and end trigrams too.
+    '''
+    padded = f'  {normalized} '
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+class TitleIndex:
+    '''
+        An index of movie titles answering which indexed title a title from
+        another source refers to. A title is looked up exactly, then by its
+        normalized form, and then, if fuzzy matching is wanted, by the
+        similarity of the character trigrams of normalized titles. Trigrams
+        are kept in an inverted index of numpy arrays, so a fuzzy lookup
+        only counts shared trigrams with the titles that have any, which
+        takes well under a millisecond for the ~10000 titles returned by
+        the imdb_scraper.py crawl_imdb_movies function.
+
+        Inputs:
+            titles: An iterable of str objects containing movie titles.
+
+            threshold: A float object between 0 and 1 specifying the least
+                Jaccard similarity of trigram sets accepted as a fuzzy
+                match. Titles must also contain the same numbers, so
+                sequels such as 'Toy Story 2' and 'Toy Story 3' are never
+                matched with each other.
+    '''
+    def __init__(self, titles, threshold=0.7):
+        self.threshold = threshold
+        self.titles = []
+        self.exact = {}
+        self.normalized = {}
+        postings = {}
+        for title in titles:
+            if title in self.exact:
+                continue
+            i = len(self.titles)
+            self.titles.append(title)
+            self.exact[title] = i
+            normalized = normalize_title(title)
+            # The first title with a normalized form keeps it.
+            self.normalized.setdefault(normalized, i)
+            for trigram in trigrams(normalized):
+                postings.setdefault(trigram, []).append(i)
+        self.postings = {trigram: np.array(ids, dtype=np.int32) \
+                         for trigram, ids in postings.items()}
+        self.sizes = np.zeros(len(self.titles), dtype=np.int32)
+        for ids in self.postings.values():
+            self.sizes[ids] += 1
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, title):
+        return title in self.exact
+
+    def similar(self, title, threshold=0.0):
+        '''
+            Return a list object of tuples of the indexed titles whose
+            trigrams have a Jaccard similarity of at least threshold with
+            those of title, and their similarities, most similar first.
+        '''
+        query = trigrams(normalize_title(title))
+        lists = [self.postings[trigram] for trigram in query \
+                 if trigram in self.postings]
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.titles))
+        similarity = shared / (len(query) + self.sizes - shared)
+        candidates = np.flatnonzero((similarity >= threshold) & (shared > 0))
+        order = np.argsort(-similarity[candidates], kind='stable')
+        return [(self.titles[i], float(similarity[i])) \
+                for i in candidates[order].tolist()]
+
+    def match(self, title, fuzzy=True):
+        '''
+            A method which finds the indexed title that title refers to.
+
+            Inputs:
+                title: A str object containing a movie title.
+
+                fuzzy: A boolean. If False, only exact and normalized
+                    matches are made.
+
+            Returns:
+                A str object containing the indexed title, or None if there
+                    is no match.
+        '''
+        i = self.exact.get(title)
+        if i is None:
+            i = self.normalized.get(normalize_title(title))
+        if i is not None:
+            return self.titles[i]
+        if not fuzzy:
+            return None
+        numbers = NUMBER.findall(normalize_title(title))
+        for candidate, _ in self.similar(title, self.threshold):
+            if NUMBER.findall(normalize_title(candidate)) == numbers:
+                return candidate
+        return None
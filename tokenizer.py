@@ -0,0 +1,133 @@
+import string
+import hashlib
+import threading
+from collections import OrderedDict
+
+PUNCTUATION = string.punctuation
+
+class Tokenizer:
+    '''
+        A reusable object which converts the text of a review into a list of
+        words, following the same rules as sentimentanalyzer.tokenize.
+        Names and stopwords are held in frozensets so that each lookup is
+        constant time, and the cleaned form of recently seen raw words is
+        remembered so that repeated words are only processed once.
+        Optionally, the tokens of whole reviews are kept in a bounded least
+        recently used cache keyed by a digest of the review, so a review
+        tokenized again, as by a scoring server sent the same reviews, is
+        only split once. Most callers tokenize each review once, and the
+        cache only slows them down, so it is off by default. The object may
+        be shared by threads.
+
+        Inputs:
+            names: An iterable of str objects containing the names to
+                remove. Names are matched before lower casing.
+
+            stopwords: An iterable of str objects containing the common
+                words to remove. Stopwords are matched after lower casing
+                and stripping punctuation.
+
+            punctuation: A str object containing the characters stripped
+                from the ends of every word.
+
+            cache_size: An int object specifying the maximum number of
+                reviews whose tokens are cached. 0 disables the cache.
+
+            max_words: An int object specifying the maximum number of raw
+                words whose cleaned forms are remembered. When it is reached
+                they are all forgotten, so memory stays bounded however many
+                reviews are tokenized.
+    '''
+    def __init__(self, names, stopwords, punctuation=PUNCTUATION, \
+                 cache_size=0, max_words=1000000):
+        self.names = frozenset(names)
+        self.stopwords = frozenset(stopwords)
+        self.punctuation = punctuation
+        self.cache_size = cache_size
+        self.max_words = max_words
+        # Maps a raw word to its cleaned form, or None if it is removed.
+        self._words = {}
+        self._cache = OrderedDict()
+        # Guards the review cache, whose order changes on every lookup.
+        # Reviews are split outside it.
+        self._lock = threading.Lock()
+
+    def clean(self, word):
+        '''
+            A method which applies the tokenize rules to a single raw word.
+
+            Inputs:
+                word: A str object containing one whitespace separated word
+                    of a review.
+
+            Returns:
+                A str object containing the cleaned word, or None if the word
+                    is a name, a stopword, or too short to keep.
+        '''
+        token = self._words.get(word, False)
+        if token is not False:
+            return token
+        if word in self.names:
+            token = None
+        else:
+            token = word.lower().strip(self.punctuation)
+            if token in self.stopwords or len(token) <= 1:
+                token = None
+        if len(self._words) >= self.max_words:
+            self._words.clear()
+        self._words[word] = token
+        return token
+
+    def _split(self, rev):
+        '''
+            Tokenize a review without consulting the review cache.
+        '''
+        words = self._words
+        tokens = []
+        for word in rev.split():
+            token = words.get(word, False)
+            if token is False:
+                token = self.clean(word)
+            if token is not None:
+                tokens.append(token)
+        return tokens
+
+    def tokenize(self, rev):
+        '''
+            A method to convert the text of a review into a list of words.
+
+            Inputs:
+                rev: A str object containing the text of a review. Other
+                    objects are converted with str, as in
+                    sentimentanalyzer.tokenize.
+
+            Returns:
+                A list object containing the words in the review. The caller
+                    may modify the list; cached tokens are not affected.
+        '''
+        rev = str(rev)
+        if not self.cache_size:
+            return self._split(rev)
+        key = hashlib.blake2b(rev.encode('utf-8', 'surrogatepass'), \
+                              digest_size=16).digest()
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is not None:
+                self._cache.move_to_end(key)
+                return list(tokens)
+        tokens = self._split(rev)
+        with self._lock:
+            self._cache[key] = tuple(tokens)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def clear_cache(self):
+        '''
+            Forget all cached reviews and words.
+        '''
+        self._words.clear()
+        with self._lock:
+            self._cache.clear()
+
+    __call__ = tokenize
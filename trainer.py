@@ -1,6 +1,237 @@
+import os
+import json
+import itertools
+import multiprocessing
+import numpy as np
 import sentimentanalyzer as sa
 
-def find_alpha(min_, max_, increment, pos_revs_dist, neg_revs_dist, df_test):
+# The AlphaSweep object used by tuning worker processes.
+_SWEEP = None
+
+class AlphaSweep:
+    '''
+        An object which evaluates many values of alpha against one test set
+        without repeating work. Both distributions are sorted once, and every
+        review of df_test is tokenized once into arrays of ngram ids. The
+        ngrams kept by find_tops for any alpha are a prefix of each sorted
+        ranking, so evaluating an alpha only requires assigning strengths to
+        those prefixes and summing them over the encoded reviews.
+        Separate values of alpha for 1grams, 2grams and 3grams can also be
+        evaluated, using the rankings restricted to each length.
+        The ratios match those of find_tops, stratify and sa.test.
+        Ngrams are handled as the int64 keys of a vocabulary.py Vocabulary,
+        and the id of an ngram is the position of its key among the sorted
+        keys of both distributions.
+
+        Inputs:
+            pos_revs_dist, neg_revs_dist: dict objects containing frequency
+                distributions of words in positive and negative reviews,
+                respectively, as returned by sa.create_big_dist, or
+                vocabulary.py NgramDistribution objects sharing one
+                Vocabulary, which is then used rather than a new one.
+                vocabulary.py VocabularyFull is raised if dict objects hold
+                more words than a Vocabulary can.
+
+            df_test: A pandas DataFrame object as described in find_alpha.
+    '''
+    def __init__(self, pos_revs_dist, neg_revs_dist, df_test):
+        # Imported here, since vocabulary imports sentimentanalyzer, which
+        # imports this module.
+        from vocabulary import Vocabulary, NgramDistribution, ngram_lengths
+        if not isinstance(pos_revs_dist, NgramDistribution):
+            vocab = Vocabulary()
+            pos_revs_dist = NgramDistribution.from_dict(vocab, pos_revs_dist)
+            neg_revs_dist = NgramDistribution.from_dict(vocab, neg_revs_dist)
+        if pos_revs_dist.vocab is not neg_revs_dist.vocab:
+            raise ValueError('The distributions must share one Vocabulary.')
+        self.vocab = pos_revs_dist.vocab
+        self.keys = np.union1d(pos_revs_dist.keys, neg_revs_dist.keys)
+        # A stable sort, so ties are ordered as in find_tops.
+        self.pos_ranking = self.rank(pos_revs_dist)
+        self.neg_ranking = self.rank(neg_revs_dist)
+        self.sizes = ngram_lengths(self.keys)
+        self._rankings_by_n = {}
+        self.encode(df_test)
+
+    def rank(self, dist):
+        '''
+            Return the ids of the ngrams in dist, an NgramDistribution, from
+            most frequently occurring to least.
+        '''
+        return np.searchsorted(self.keys, dist.ranking())
+
+    def encode(self, df_test):
+        '''
+            A method which tokenizes the reviews of df_test once, keeping
+            the ids of the ngrams which could receive a sentiment strength.
+
+            Inputs:
+                df_test: A pandas DataFrame object as described in
+                    find_alpha.
+
+            Returns:
+                Nothing is returned. The ids, signs (-1 for unigrams
+                    following 'not'), review numbers and labels are stored
+                    as numpy arrays.
+        '''
+        # sa.test passes tokens to get_sentiment, which tokenizes again.
+        token_lists = [sa.tokenize(sa.tokenize(str(rev))) \
+                       for rev in df_test['Review']]
+        not_id = self.vocab.add('not')
+        words, rows = self.vocab.encode(token_lists, add=False)
+        empty = np.zeros(0, dtype=np.int64)
+        ids = [empty]
+        signs = [empty]
+        review_rows = [empty]
+        for n in range(1, 4):
+            count = len(words) - n + 1
+            if count <= 0 or not len(self.keys):
+                continue
+            # Ngrams must lie within one review and hold only known words,
+            # since a key with a leading 0 id is the key of a shorter ngram.
+            keep = rows[n - 1:] == rows[:count]
+            for i in range(n):
+                keep &= words[i : count + i] != 0
+            keys = self.vocab.pack([words[i : count + i] for i in range(n)])
+            pos = np.searchsorted(self.keys, keys)
+            pos[pos == len(self.keys)] = 0
+            keep &= self.keys[pos] == keys
+            sign = np.ones(count, dtype=np.int64)
+            if n == 1:
+                sign[1:][(words[:-1] == not_id) & (rows[1:] == rows[:-1])] = -1
+            ids.append(pos[keep])
+            signs.append(sign[keep])
+            review_rows.append(rows[:count][keep])
+        self.ids = np.concatenate(ids)
+        self.signs = np.concatenate(signs)
+        self.rows = np.concatenate(review_rows)
+        self.labels = np.array([label == True for label in \
+                                df_test['Review is Positive']], dtype=bool)
+
+    def rankings(self, n=None):
+        '''
+            A method which returns the positive and negative rankings,
+            restricted to ngrams of length n if n is given. Filtering keeps
+            the order of ties, so each restricted ranking is the ranking
+            find_tops would use on a distribution of only those ngrams.
+        '''
+        if n is None:
+            return self.pos_ranking, self.neg_ranking
+        if n not in self._rankings_by_n:
+            self._rankings_by_n[n] = \
+                (self.pos_ranking[self.sizes[self.pos_ranking] == n], \
+                 self.neg_ranking[self.sizes[self.neg_ranking] == n])
+        return self._rankings_by_n[n]
+
+    def stratify_ranking(self, pos_ranking, neg_ranking, alpha, strengths):
+        '''
+            A method which assigns the strengths find_tops and stratify would
+            give to the ngrams of one pair of rankings for a given alpha.
+
+            Inputs:
+                pos_ranking, neg_ranking: numpy arrays of ngram ids, as
+                    returned by rankings.
+
+                alpha: A float object, as in sa.find_tops.
+
+                strengths: A numpy array indexed by ngram id.
+
+            Returns:
+                Nothing is returned. strengths is modified in place.
+        '''
+        k = round(alpha * min(len(pos_ranking), len(neg_ranking)))
+        top_pos = pos_ranking[:k]
+        top_neg = neg_ranking[:k]
+        shared = np.intersect1d(top_pos, top_neg)
+        top_pos = top_pos[~np.isin(top_pos, shared)]
+        top_neg = top_neg[~np.isin(top_neg, shared)]
+        num_words = len(top_pos)
+        top = round(num_words / 20)
+        quart = round(num_words / 4)
+        divs = np.array([0, top, quart, 2 * quart, 3 * quart, num_words])
+        tiers = np.searchsorted(divs, np.arange(num_words), side='right') - 1
+        strengths[top_pos] = (len(divs) - 1) - tiers
+        strengths[top_neg] = -(len(divs) - 1) + tiers
+
+    def strength_array(self, alpha):
+        '''
+            A method which computes the sentiment strength of every ngram in
+            the vocabulary, as find_tops and stratify would.
+
+            Inputs:
+                alpha: A float object, as in sa.find_tops, or a tuple of
+                    three float objects (alpha_1, alpha_2, alpha_3) used for
+                    1grams, 2grams and 3grams separately, as in
+                    build_sentiment_strengths_123grams.
+
+            Returns:
+                A numpy array indexed by ngram id. Ngrams without a
+                    sentiment strength are 0.
+        '''
+        strengths = np.zeros(len(self.keys), dtype=np.int64)
+        if isinstance(alpha, tuple):
+            for n, alpha_n in enumerate(alpha, 1):
+                pos_ranking, neg_ranking = self.rankings(n)
+                self.stratify_ranking(pos_ranking, neg_ranking, alpha_n, \
+                                      strengths)
+        else:
+            self.stratify_ranking(self.pos_ranking, self.neg_ranking, alpha, \
+                                  strengths)
+        return strengths
+
+    def sentiment_strengths(self, alpha):
+        '''
+            Return the sentiment_strengths dict object which find_tops and
+            stratify would build for a given alpha, or tuple of alphas as in
+            strength_array.
+        '''
+        strengths = self.strength_array(alpha)
+        ids = np.flatnonzero(strengths)
+        return dict(zip(self.vocab.grams(self.keys[ids]), \
+                        strengths[ids].tolist()))
+
+    def ratio(self, alpha):
+        '''
+            A method which computes the proportion of classified test reviews
+            which are classified correctly for a given alpha, as sa.test
+            would.
+
+            Inputs:
+                alpha: A float object or tuple, as in strength_array.
+
+            Returns:
+                A float object, as returned by sa.test.
+        '''
+        strengths = self.strength_array(alpha)
+        weights = strengths[self.ids] * self.signs
+        sentiments = np.bincount(self.rows, weights=weights, \
+                                 minlength=len(self.labels))
+        classified = sentiments != 0
+        correct = int(np.sum((sentiments > 0)[classified] == \
+                             self.labels[classified]))
+        total = int(np.sum(classified))
+        return correct / total
+
+def alpha_range(min_, max_, increment):
+    '''
+        A function which lists the values of alpha tested between min_ and
+        max_, including both, in steps of increment.
+
+        Inputs:
+            min_, max_, increment: float objects, as in find_alpha.
+
+        Returns:
+            A list object containing float objects.
+    '''
+    alphas = []
+    i = min_
+    while i <= max_:
+        alphas.append(i)
+        i += increment
+    return alphas
+
+def find_alpha(min_, max_, increment, pos_revs_dist, neg_revs_dist, df_test, \
+               sweep=None):
     '''
         Function to find the optimal proportion (alpha) of the frequency
         distributions to use between min_ and max_. Our condition for
@@ -23,6 +254,11 @@ def find_alpha(min_, max_, increment, pos_revs_dist, neg_revs_dist, df_test):
                 titles, a column with the text of a review for that movie,
                 and a column with True (False) indicating the review was
                 positive (negative).
+
+            sweep: An AlphaSweep object built from pos_revs_dist,
+                neg_revs_dist, and df_test. If it is not passed in, we build
+                it, so the distributions are sorted and df_test is tokenized
+                once for all of the values of alpha tested.
         
         Returns:
             A tuple of float objects whose first element is the highest
@@ -30,21 +266,16 @@ def find_alpha(min_, max_, increment, pos_revs_dist, neg_revs_dist, df_test):
                 of alpha tested, and whose second element is the value of
                 alpha for which this maximum was achieved.
     '''
+    if sweep is None:
+        sweep = AlphaSweep(pos_revs_dist, neg_revs_dist, df_test)
     ratios = []
-    i = min_
-    while i <= max_:
+    for i in alpha_range(min_, max_, increment):
         if i == 0:
             # Set ratio to -1 because we don't want to use alpha=0
             ratios.append((-1, i))
-            i += increment
             continue
-        most_common_pos, most_common_neg = sa.find_tops(pos_revs_dist, \
-                                                        neg_revs_dist, alpha=i)
-        sentiment_strengths = {}
-        sa.stratify(most_common_pos, most_common_neg, sentiment_strengths)
-        ratio = sa.test(df_test, sentiment_strengths)
+        ratio = sweep.ratio(i)
         ratios.append((ratio, i))
-        i += increment
     return max(ratios)
 
 def train_alpha(min_, max_, increment, pos_revs_dist, neg_revs_dist, df_test):
@@ -53,7 +284,8 @@ def train_alpha(min_, max_, increment, pos_revs_dist, neg_revs_dist, df_test):
         estimate of the optimal value of alpha to use.
         We choose to call this function with min_ = 0.0, max_ = 1.0,
         and increment = 0.1 in order to obtain an estimate of alpha to the
-        third decimal place.
+        third decimal place. Every round shares one AlphaSweep object, so
+        the whole search costs about as much as a single pass over df_test.
         
         Inputs:
             The inputs are the same as in find_alpha.
@@ -61,10 +293,182 @@ def train_alpha(min_, max_, increment, pos_revs_dist, neg_revs_dist, df_test):
         Returns:
             A tuple of floats, as in find_alpha.
     '''
+    sweep = AlphaSweep(pos_revs_dist, neg_revs_dist, df_test)
     for _ in range(1, 4):
         ratio, alpha = find_alpha(min_, max_, increment, \
-                                  pos_revs_dist, neg_revs_dist, df_test)
+                                  pos_revs_dist, neg_revs_dist, df_test, sweep)
         min_ = max(alpha - increment / 2, 0)
         max_ = min(1, alpha + increment /2)
         increment /= 10
     return ratio, alpha
+
+###################################################################
+# Parallel Tuning
+###################################################################
+def _init_worker(sweep):
+    '''
+        Give a worker process its copy of the AlphaSweep object when it
+        cannot be inherited by forking.
+    '''
+    global _SWEEP
+    _SWEEP = sweep
+
+def _evaluate(alphas):
+    '''
+        Compute the classification success rate for a tuple of alphas in a
+        worker process. A tuple of one alpha is evaluated as in find_alpha,
+        and a tuple of three as (alpha_1, alpha_2, alpha_3). As in
+        find_alpha, we do not want to use alphas which are all 0, and a
+        value leaving every review unclassified is also given -1.
+    '''
+    if not any(alphas):
+        return alphas, -1
+    alpha = alphas[0] if len(alphas) == 1 else tuple(alphas)
+    try:
+        return alphas, _SWEEP.ratio(alpha)
+    except ZeroDivisionError:
+        return alphas, -1
+
+def _log_key(alphas):
+    '''
+        Round a tuple of alphas so values read back from a tuning log match
+        values computed by alpha_range.
+    '''
+    return tuple(round(alpha, 12) for alpha in alphas)
+
+def read_tuning_log(log_file):
+    '''
+        A function which reads the results recorded by parallel_search.
+
+        Inputs:
+            log_file: A str object containing the name of a file with one
+                json object per line, holding a list of alphas and the
+                classification success rate achieved with them. A partially
+                written last line is ignored.
+
+        Returns:
+            A dict object mapping tuples of rounded alphas to their success
+                rates. It is empty if log_file is None or does not exist.
+    '''
+    results = {}
+    if not log_file or not os.path.exists(log_file):
+        return results
+    with open(log_file, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            results[_log_key(entry['alphas'])] = entry['ratio']
+    return results
+
+def parallel_search(sweep, ranges, processes=None, log_file=None, rounds=3):
+    '''
+        A function which performs the coarse to fine search of train_alpha
+        over one or several alphas at once, evaluating every candidate of a
+        round in a pool of worker processes. Workers share the read-only
+        AlphaSweep object (by forking where possible). Each result is
+        appended to log_file as soon as it is computed, and candidates
+        already in log_file are not evaluated again, so an interrupted run
+        can be continued by calling this function again with the same
+        arguments. A log file must only be reused with the same training
+        and test data.
+
+        Inputs:
+            sweep: An AlphaSweep object.
+
+            ranges: A list object containing one (min_, max_, increment)
+                tuple per alpha, as in find_alpha. One range tunes alpha,
+                and three ranges tune alpha_1, alpha_2, and alpha_3 jointly.
+
+            processes: An int object specifying the number of worker
+                processes. By default, one per core is used.
+
+            log_file: A str object containing the name of the tuning log,
+                or None to keep results in memory only.
+
+            rounds: An int object specifying the number of refinements, as
+                in train_alpha.
+
+        Returns:
+            A tuple whose first element is the highest classification
+                success rate achieved and whose second element is the tuple
+                of alphas achieving it.
+    '''
+    global _SWEEP
+    processes = processes or os.cpu_count()
+    results = read_tuning_log(log_file)
+    context = multiprocessing.get_context()
+    if context.get_start_method() == 'fork':
+        _SWEEP = sweep
+        pool = context.Pool(processes)
+    else:
+        pool = context.Pool(processes, _init_worker, (sweep,))
+    log = open(log_file, 'a') if log_file else None
+    try:
+        with pool:
+            for _ in range(rounds):
+                grid = list(itertools.product( \
+                    *(alpha_range(*range_) for range_ in ranges)))
+                todo = [alphas for alphas in grid \
+                        if _log_key(alphas) not in results]
+                chunksize = max(1, len(todo) // (4 * processes))
+                for alphas, ratio in pool.imap_unordered(_evaluate, todo, \
+                                                         chunksize):
+                    results[_log_key(alphas)] = ratio
+                    if log:
+                        log.write(json.dumps({'alphas': list(alphas), \
+                                              'ratio': ratio}) + '\n')
+                        log.flush()
+                ratio, best = max((results[_log_key(alphas)], alphas) \
+                                  for alphas in grid)
+                ranges = [(max(alpha - increment / 2, 0), \
+                           min(1, alpha + increment / 2), increment / 10) \
+                          for alpha, (_, _, increment) in zip(best, ranges)]
+    finally:
+        if log:
+            log.close()
+    return ratio, best
+
+def tune_alpha(pos_revs_dist, neg_revs_dist, df_test, processes=None, \
+               log_file=None):
+    '''
+        A parallel, resumable version of train_alpha called with
+        min_ = 0.0, max_ = 1.0, and increment = 0.1.
+
+        Inputs:
+            pos_revs_dist, neg_revs_dist, df_test: As in find_alpha.
+
+            processes, log_file: As in parallel_search.
+
+        Returns:
+            A tuple of floats, as in find_alpha.
+    '''
+    sweep = AlphaSweep(pos_revs_dist, neg_revs_dist, df_test)
+    ratio, alphas = parallel_search(sweep, [(0.0, 1.0, 0.1)], processes, \
+                                    log_file)
+    return ratio, alphas[0]
+
+def tune_123gram_alphas(pos_revs_dist, neg_revs_dist, df_test, \
+                        processes=None, log_file=None):
+    '''
+        A function which jointly tunes sa.ALPHA_1, sa.ALPHA_2, and sa.ALPHA_3,
+        the proportions of the 1gram, 2gram, and 3gram distributions used by
+        the sentiment_analyzer_builder.py build_sentiment_strengths_123grams
+        function.
+
+        Inputs:
+            pos_revs_dist, neg_revs_dist: dict objects, as returned by
+                sa.create_big_dist.
+
+            df_test: As in find_alpha.
+
+            processes, log_file: As in parallel_search.
+
+        Returns:
+            A tuple whose first element is the highest classification
+                success rate achieved and whose second element is a tuple of
+                alpha_1, alpha_2, and alpha_3.
+    '''
+    sweep = AlphaSweep(pos_revs_dist, neg_revs_dist, df_test)
+    return parallel_search(sweep, 3 * [(0.0, 1.0, 0.1)], processes, log_file)
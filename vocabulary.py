@@ -0,0 +1,519 @@
+import os
+import glob
+import shutil
+import hashlib
+import tempfile
+from collections import Counter
+import numpy as np
+import sentimentanalyzer as sa
+
+# Each word id takes ID_BITS bits of an int64 ngram key, so a key holds up
+# to three ids. Id 0 is never given to a word, so the keys of 1grams, 2grams
+# and 3grams fall in separate ranges and the length of an ngram can be read
+# from its key.
+ID_BITS = 21
+MAX_WORDS = 2 ** ID_BITS - 1
+ID_MASK = 2 ** ID_BITS - 1
+# Roughly the bytes a Vocabulary takes per word: the token, its dict entry,
+# its id, and its place in the list of tokens.
+VOCABULARY_WORD_BYTES = 128
+
+class VocabularyFull(ValueError):
+    '''
+        Raised when a Vocabulary is given more than MAX_WORDS tokens, which
+        their ids could not hold.
+    '''
+
+class Vocabulary:
+    '''
+        A mapping between tokens and int32 ids, shared by every stage of
+        training, tuning and scoring so ngrams are handled as int64 keys
+        rather than joined strings. The key of an ngram packs the ids of its
+        words, first word in the highest bits, and can always be converted
+        back to the ngram's string.
+
+        Inputs:
+            tokens: An iterable of tokens to give ids to first, or None.
+    '''
+    def __init__(self, tokens=None):
+        self.ids = {}
+        self.tokens = [None]
+        if tokens is not None:
+            for token in tokens:
+                self.add(token)
+
+    def __len__(self):
+        return len(self.tokens) - 1
+
+    def add(self, token):
+        '''
+            Return the id of token, giving it the next id if it has none.
+        '''
+        token_id = self.ids.get(token)
+        if token_id is None:
+            if len(self.tokens) > MAX_WORDS:
+                raise VocabularyFull(f'A Vocabulary holds at most '
+                                     f'{MAX_WORDS} tokens.')
+            token_id = len(self.tokens)
+            self.ids[token] = token_id
+            self.tokens.append(token)
+        return token_id
+
+    def encode(self, token_lists, add=True):
+        '''
+            A method which converts tokenized reviews into word ids.
+
+            Inputs:
+                token_lists: A list object containing lists of tokens, as
+                    returned by the sentimentanalyzer.py tokenize function.
+
+                add: A boolean. If True, new tokens are given ids, and
+                    otherwise they are given id 0.
+
+            Returns:
+                A tuple of two numpy arrays holding the int32 id of every
+                    token of every review and the position of its review in
+                    token_lists.
+        '''
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, \
+                              count=len(token_lists))
+        if add:
+            ids = (self.add(token) for tokens in token_lists \
+                   for token in tokens)
+        else:
+            get = self.ids.get
+            ids = (get(token, 0) for tokens in token_lists for token in tokens)
+        ids = np.fromiter(ids, dtype=np.int32, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(len(token_lists)), lengths)
+        return ids, rows
+
+    @staticmethod
+    def pack(ids):
+        '''
+            Pack a sequence of word ids (ints or numpy arrays) into one key,
+            or an array of keys.
+        '''
+        key = ids[0]
+        if isinstance(key, np.ndarray):
+            key = key.astype(np.int64)
+        for word_id in ids[1:]:
+            key = (key << ID_BITS) | word_id
+        return key
+
+    @staticmethod
+    def ngram_keys(ids, rows, n):
+        '''
+            Return the int64 keys of every ngram of length n in encoded
+            reviews, in order, leaving out ngrams which would span two
+            reviews.
+        '''
+        count = len(ids) - n + 1
+        if count <= 0:
+            return np.zeros(0, dtype=np.int64)
+        keys = Vocabulary.pack([ids[i : count + i] for i in range(n)])
+        return keys[rows[n - 1:] == rows[:count]]
+
+    def key(self, gram):
+        '''
+            Return the key of an ngram string, or None if one of its words
+            has no id.
+        '''
+        key = 0
+        for word in gram.split(' '):
+            token_id = self.ids.get(word)
+            if token_id is None:
+                return None
+            key = (key << ID_BITS) | token_id
+        return key
+
+    def gram(self, key):
+        '''
+            Return the ngram string of a key.
+        '''
+        key = int(key)
+        words = []
+        while key:
+            words.append(self.tokens[key & ID_MASK])
+            key >>= ID_BITS
+        return ' '.join(reversed(words))
+
+    def grams(self, keys):
+        '''
+            Return a list object containing the ngram string of each key in
+            an array of keys.
+        '''
+        return [self.gram(key) for key in keys.tolist()]
+
+def ngram_lengths(keys):
+    '''
+        Return an array holding the length of the ngram of each key.
+    '''
+    return 1 + (keys >= 2 ** ID_BITS) + (keys >= 2 ** (2 * ID_BITS))
+
+class NgramDistribution:
+    '''
+        A frequency distribution of ngrams held as two numpy arrays: the
+        int64 keys of the ngrams, given by a Vocabulary, and their int64
+        counts. Ngrams are kept in the order the dict objects of the
+        sentimentanalyzer.py create_big_dist function hold them, so ties are
+        broken as find_tops breaks them.
+
+        Inputs:
+            vocab: A Vocabulary object.
+
+            keys, counts: numpy arrays of int64.
+    '''
+    def __init__(self, vocab, keys, counts):
+        self.vocab = vocab
+        self.keys = keys
+        self.counts = counts
+
+    @classmethod
+    def from_dict(cls, vocab, dist):
+        '''
+            Build a distribution from a dict object mapping ngram strings to
+            counts, such as those returned by create_big_dist.
+        '''
+        for gram in dist:
+            for word in gram.split(' '):
+                vocab.add(word)
+        keys = np.fromiter((vocab.key(gram) for gram in dist), \
+                           dtype=np.int64, count=len(dist))
+        counts = np.fromiter(dist.values(), dtype=np.int64, count=len(dist))
+        return cls(vocab, keys, counts)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def restrict(self, n):
+        '''
+            Return the distribution of only the ngrams of length n, in the
+            same order.
+        '''
+        keep = ngram_lengths(self.keys) == n
+        return NgramDistribution(self.vocab, self.keys[keep], \
+                                 self.counts[keep])
+
+    def to_dict(self):
+        '''
+            Return a Counter object mapping ngram strings to counts, equal,
+            and in the same order, to the one create_big_dist returns.
+        '''
+        return Counter(dict(zip(self.vocab.grams(self.keys), \
+                                self.counts.tolist())))
+
+    def ranking(self):
+        '''
+            Return the keys from most frequently occurring to least, with
+            ties in order, as find_tops sorts them.
+        '''
+        return self.keys[np.argsort(-self.counts, kind='stable')]
+
+def count_distribution(vocab, token_lists, ns=(1, 2, 3)):
+    '''
+        A function which counts the ngrams of tokenized reviews into an
+        NgramDistribution, ordering the ngrams of each length by their
+        first occurrence and placing shorter ngrams first.
+
+        Inputs:
+            vocab: A Vocabulary object.
+
+            token_lists: A list object containing lists of tokens.
+
+            ns: A tuple of int objects containing the ngram lengths to count.
+
+        Returns:
+            An NgramDistribution object.
+    '''
+    ids, rows = vocab.encode(token_lists)
+    all_keys = []
+    all_counts = []
+    for n in ns:
+        keys, first, counts = np.unique(Vocabulary.ngram_keys(ids, rows, n), \
+                                        return_index=True, return_counts=True)
+        order = np.argsort(first, kind='stable')
+        all_keys.append(keys[order])
+        all_counts.append(counts[order].astype(np.int64))
+    return NgramDistribution(vocab, np.concatenate(all_keys), \
+                             np.concatenate(all_counts))
+
+def create_big_dist(revs, vocab=None):
+    '''
+        A function which computes the distributions of the
+        sentimentanalyzer.py create_big_dist function as NgramDistribution
+        objects, without building any ngram strings.
+
+        Inputs:
+            revs: A dict object as described in the sentimentanalyzer.py
+                get_revs function.
+
+            vocab: A Vocabulary object. By default, a new one is made. A
+                Vocabulary passed in is always used, even when it is empty,
+                so distributions built separately can share it.
+
+        Returns:
+            A tuple containing the positive and negative NgramDistribution
+                objects, which share one Vocabulary.
+    '''
+    # Not "vocab or Vocabulary()": an empty Vocabulary is falsy.
+    if vocab is None:
+        vocab = Vocabulary()
+    pos_tokens = []
+    neg_tokens = []
+    for rev, is_pos in revs.items():
+        if is_pos:
+            pos_tokens.append(sa.tokenize(rev))
+        else:
+            neg_tokens.append(sa.tokenize(rev))
+    return count_distribution(vocab, pos_tokens), \
+           count_distribution(vocab, neg_tokens)
+
+class NgramCounter:
+    '''
+        A frequency distribution of ngrams which is built incrementally from
+        batches of tokenized reviews and may grow larger than memory. Each
+        batch is reduced to a table of ngram keys, counts and positions of
+        first occurrence, and tables are merged as they accumulate. When the
+        merged tables exceed memory_budget bytes they are spilled to files,
+        split into buckets by key, and each bucket is merged on its own when
+        the distribution is read. Only the final distribution and one bucket
+        need to fit in memory at once, rather than every review.
+
+        Inputs:
+            vocab: A Vocabulary object, which may be shared with other
+                counters.
+
+            memory_budget: An int object specifying the bytes of count tables
+                held in memory before spilling.
+
+            spill_dir: A str object containing a directory in which spill
+                files are made, or None for the system temporary directory.
+
+            buckets: An int object specifying the number of buckets spilled
+                tables are split into.
+
+            ns: A tuple of int objects containing the ngram lengths to count.
+    '''
+    def __init__(self, vocab, memory_budget=2 ** 28, spill_dir=None, \
+                 buckets=16, ns=(1, 2, 3)):
+        self.vocab = vocab
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.buckets = buckets
+        self.ns = ns
+        self.runs = 0
+        self._offsets = {n: 0 for n in ns}
+        self._tables = []
+        self._bytes = 0
+        self._directory = None
+
+    @staticmethod
+    def _merge(tables):
+        '''
+            Merge tables, each a (3, m) int64 array of keys, counts and
+            first occurrences, into one table sorted by key.
+        '''
+        if not tables:
+            return np.zeros((3, 0), dtype=np.int64)
+        table = np.concatenate(tables, axis=1)
+        keys, inverse = np.unique(table[0], return_inverse=True)
+        counts = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(counts, inverse, table[1])
+        first = np.full(len(keys), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(first, inverse, table[2])
+        return np.stack([keys, counts, first])
+
+    def add(self, token_lists):
+        '''
+            Count the ngrams of a list of tokenized reviews.
+        '''
+        ids, rows = self.vocab.encode(token_lists)
+        for n in self.ns:
+            keys = Vocabulary.ngram_keys(ids, rows, n)
+            unique, first, counts = np.unique(keys, return_index=True, \
+                                              return_counts=True)
+            table = np.stack([unique, counts.astype(np.int64), \
+                              first.astype(np.int64) + self._offsets[n]])
+            self._offsets[n] += len(keys)
+            self._tables.append(table)
+            self._bytes += table.nbytes
+        if self._bytes > self.memory_budget:
+            table = self._merge(self._tables)
+            if table.nbytes > self.memory_budget // 2:
+                self._spill(table)
+                self._tables = []
+                self._bytes = 0
+            else:
+                self._tables = [table]
+                self._bytes = table.nbytes
+
+    def _spill(self, table):
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='ngrams-', \
+                                               dir=self.spill_dir)
+        bucket_of = table[0] % self.buckets
+        for bucket in range(self.buckets):
+            np.save(os.path.join(self._directory, \
+                                 f'{bucket}-{self.runs}.npy'), \
+                    table[:, bucket_of == bucket])
+        self.runs += 1
+
+    def distribution(self):
+        '''
+            Return the NgramDistribution of every review added, with ngrams
+            in the order count_distribution would give them.
+        '''
+        table = self._merge(self._tables)
+        if self.runs:
+            bucket_of = table[0] % self.buckets
+            parts = []
+            for bucket in range(self.buckets):
+                tables = [np.load(name) for name in glob.glob( \
+                    os.path.join(self._directory, f'{bucket}-*.npy'))]
+                tables.append(table[:, bucket_of == bucket])
+                parts.append(self._merge(tables))
+            table = np.concatenate(parts, axis=1)
+        keys, counts, first = table
+        order = np.lexsort((first, ngram_lengths(keys)))
+        return NgramDistribution(self.vocab, keys[order], counts[order])
+
+    def close(self):
+        '''
+            Remove the spill files.
+        '''
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def _review_digests(reviews):
+    '''
+        Return a numpy array of uint64 holding an 8 byte content hash of
+        each review.
+    '''
+    return np.fromiter((int.from_bytes(hashlib.blake2b( \
+                            str(rev).encode('utf-8'), digest_size=8).digest(), \
+                        'little') for rev in reviews), \
+                       dtype=np.uint64, count=len(reviews))
+
+def create_big_dist_from_chunks(chunks, vocab=None, memory_budget=2 ** 28, \
+                                spill_dir=None):
+    '''
+        A function which computes the distributions of create_big_dist from
+        an iterable of chunks of training reviews, so the training data need
+        not fit in memory. As in the sentimentanalyzer.py get_revs function,
+        a review repeated in the data is counted once. Where copies of a
+        review have different labels, get_revs keeps the last label, while
+        this function keeps the first, since later chunks are not yet read.
+
+        Repeats are found with a sorted array of an 8 byte hash of every
+        distinct review, which, like the Vocabulary, cannot be spilled.
+        Both are charged against memory_budget, so count tables spill
+        sooner as they grow, but memory still grows by about 8 bytes per
+        distinct review and VOCABULARY_WORD_BYTES per distinct word beyond
+        the budget once they outgrow it. That is far less than the reviews
+        themselves.
+
+        Inputs:
+            chunks: An iterable of pandas DataFrame objects with the columns
+                described in the sentimentanalyzer.py get_revs function, such
+                as the chunks returned by pd.read_csv with chunksize.
+
+            vocab: A Vocabulary object. By default, a new one is made.
+
+            memory_budget: An int object specifying the bytes held by the
+                count tables, the review hashes, and the Vocabulary, with
+                what is left after the latter two split between the positive
+                and negative count tables, as in NgramCounter.
+
+            spill_dir: As in NgramCounter.
+
+        Returns:
+            A tuple containing the positive and negative NgramDistribution
+                objects, which share one Vocabulary.
+    '''
+    if vocab is None:
+        vocab = Vocabulary()
+    seen = np.zeros(0, dtype=np.uint64)
+    with NgramCounter(vocab, memory_budget // 2, spill_dir) as pos_counter, \
+         NgramCounter(vocab, memory_budget // 2, spill_dir) as neg_counter:
+        for chunk in chunks:
+            reviews = chunk['Review'].tolist()
+            labels = chunk['Review is Positive'].tolist()
+            digests = _review_digests(reviews)
+            # The first copy of each review in the chunk, if it is new.
+            _, first = np.unique(digests, return_index=True)
+            keep = np.zeros(len(reviews), dtype=bool)
+            keep[first] = True
+            keep &= ~np.isin(digests, seen, assume_unique=False)
+            seen = np.union1d(seen, digests[keep])
+            pos_tokens = []
+            neg_tokens = []
+            for i in np.flatnonzero(keep).tolist():
+                if labels[i]:
+                    pos_tokens.append(sa.tokenize(reviews[i]))
+                else:
+                    neg_tokens.append(sa.tokenize(reviews[i]))
+            budget = memory_budget - seen.nbytes - \
+                     VOCABULARY_WORD_BYTES * len(vocab)
+            pos_counter.memory_budget = neg_counter.memory_budget = \
+                max(budget, 0) // 2
+            pos_counter.add(pos_tokens)
+            neg_counter.add(neg_tokens)
+        return pos_counter.distribution(), neg_counter.distribution()
+
+def find_tops(pos_dist, neg_dist, alpha=sa.ALPHA):
+    '''
+        A function which selects the same ngrams as the sentimentanalyzer.py
+        find_tops function.
+
+        Inputs:
+            pos_dist, neg_dist: NgramDistribution objects.
+
+            alpha: A float object, as in the sentimentanalyzer.py find_tops
+                function.
+
+        Returns:
+            Two numpy arrays of the same length, holding the keys of the most
+                frequently occurring ngrams of each distribution, most
+                frequent first, with ngrams in both removed.
+    '''
+    k = round(alpha * min(len(pos_dist), len(neg_dist)))
+    top_pos = pos_dist.ranking()[:k]
+    top_neg = neg_dist.ranking()[:k]
+    shared = np.intersect1d(top_pos, top_neg)
+    return top_pos[~np.isin(top_pos, shared)], \
+           top_neg[~np.isin(top_neg, shared)]
+
+def stratify(vocab, top_pos, top_neg, sentiment_strengths):
+    '''
+        A function which adds the strengths the sentimentanalyzer.py
+        stratify function would give the ngrams selected by find_tops to
+        sentiment_strengths, converting their keys back to strings.
+
+        Inputs:
+            vocab: The Vocabulary object of the keys.
+
+            top_pos, top_neg: numpy arrays as returned by find_tops.
+
+            sentiment_strengths: A dict object as described in the
+                sentimentanalyzer.py stratify function.
+
+        Returns:
+            Nothing is returned. sentiment_strengths is modified in place.
+    '''
+    num_words = len(top_pos)
+    top = round(num_words / 20)
+    quart = round(num_words / 4)
+    divs = np.array([0, top, quart, 2 * quart, 3 * quart, num_words])
+    tiers = np.searchsorted(divs, np.arange(num_words), side='right') - 1
+    strengths = ((len(divs) - 1) - tiers).tolist()
+    for pos_gram, neg_gram, strength in zip(vocab.grams(top_pos), \
+                                            vocab.grams(top_neg), strengths):
+        sentiment_strengths[pos_gram] = strength
+        sentiment_strengths[neg_gram] = -strength